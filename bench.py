@@ -0,0 +1,839 @@
+import datetime as dt
+import io
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import replace
+
+import fitz
+import numpy as np
+import pandas as pd
+from PIL import Image
+from pymupdf import Document, Page
+
+import prepare
+
+Q_ID_PAT: str = r"Question ID ([0-9a-f]{8})"
+
+
+def bundled_q_pdfs(with_excluded: bool = False) -> list[str]:
+    q_dirs = ["./alls/questions/"]
+    if with_excluded:
+        q_dirs.append("./old-excluded-qs/")
+
+    paths: list[str] = []
+    for q_dir in q_dirs:
+        for name in sorted(os.listdir(q_dir)):
+            if name.endswith(".pdf"):
+                paths.append(os.path.join(q_dir, name))
+
+    return paths
+
+
+def bundled_a_pdfs() -> list[str]:
+    a_dir = "./alls/answers/"
+    return [os.path.join(a_dir, name) for name in sorted(os.listdir(a_dir)) if name.endswith(".pdf")]
+
+
+def legacy_page_pass(doc: Document, page: Page) -> None:
+    # NOTE: This is what the parser used to do for every page: one get_text() for the empty
+    #       check, another one for the regexes and a full get_drawings() for question id pages.
+    page_text = page.get_text()
+    assert isinstance(page_text, str)
+    if not (bool(page_text.strip()) or bool(page.get_images())):
+        return
+
+    text = page.get_text()
+    assert isinstance(text, str)
+    if len(re.findall(Q_ID_PAT, text)) == 1:
+        page.get_drawings()
+
+
+def extract_page_pass(doc: Document, page: Page) -> None:
+    extract = prepare.PageExtract(page)
+    if extract.is_empty():
+        return
+
+    if len(re.findall(Q_ID_PAT, extract.text)) == 1:
+        prepare.get_difficulty(doc, extract, drawing_only=True)
+
+
+def bench_page_pass(paths: list[str]) -> None:
+    print("Per-page extraction (ms / page):")
+    for path in paths:
+        doc: Document = fitz.open(path)
+        page_count = len(doc)
+
+        results: list[float] = []
+        for page_pass in [legacy_page_pass, extract_page_pass]:
+            start = time.perf_counter()
+            for page_ind in range(page_count):
+                page_pass(doc, doc.load_page(page_ind))
+            results.append((time.perf_counter() - start) * 1000 / page_count)
+
+        legacy_ms, extract_ms = results
+        print(
+            f"    {os.path.basename(path):32} legacy {legacy_ms:7.3f}  "
+            f"extract {extract_ms:7.3f}  ({legacy_ms / extract_ms:.2f}x)"
+        )
+
+
+def legacy_difficulty(doc: Document, page: Page) -> None:
+    # NOTE: The old detector: full get_drawings() and, when no bars are found, decoding every
+    #       image on the page with PIL.
+    diff_d_color = (0.0, 0.37254899740219116, 0.6274510025978088)
+    count = 0
+    for d in page.get_drawings():
+        color = d["fill"]
+        if color is not None and all(abs(a - b) < 5e-5 for a, b in zip(color, diff_d_color)):
+            count += 1
+
+    if count > 0:
+        return
+
+    for img in page.get_images(full=True):
+        pil_img = Image.open(io.BytesIO(doc.extract_image(img[0])["image"]))
+        if pil_img.width != 46:
+            continue
+
+        y = int(pil_img.height / 2)
+        for x in [5, pil_img.width / 2, pil_img.width - 5]:
+            pil_img.getpixel((int(x), y))
+
+
+def header_difficulty(
+    doc: Document, extract: prepare.PageExtract, xref_counts: dict[int, int]
+) -> None:
+    if prepare.get_difficulty(doc, extract, drawing_only=True) is None:
+        prepare.get_difficulty(doc, extract, drawing_only=False, xref_counts=xref_counts)
+
+
+def bench_difficulty(paths: list[str]) -> None:
+    print("Difficulty detection on question id pages (ms / page):")
+    for path in paths:
+        doc: Document = fitz.open(path)
+        id_pages: list[int] = []
+        for page_ind in range(len(doc)):
+            text = doc.load_page(page_ind).get_text()
+            assert isinstance(text, str)
+            if len(re.findall(Q_ID_PAT, text)) == 1:
+                id_pages.append(page_ind)
+
+        start = time.perf_counter()
+        for page_ind in id_pages:
+            legacy_difficulty(doc, doc.load_page(page_ind))
+        legacy_ms = (time.perf_counter() - start) * 1000 / len(id_pages)
+
+        # NOTE: The text extraction is already paid for by the parser loop, so keep it out
+        #       of the comparison.
+        extracts = [prepare.PageExtract(doc.load_page(page_ind)) for page_ind in id_pages]
+        xref_counts: dict[int, int] = {}
+        start = time.perf_counter()
+        for extract in extracts:
+            header_difficulty(doc, extract, xref_counts)
+        header_ms = (time.perf_counter() - start) * 1000 / len(id_pages)
+
+        print(
+            f"    {os.path.basename(path):32} legacy {legacy_ms:7.3f}  "
+            f"header {header_ms:7.3f}  ({legacy_ms / header_ms:.2f}x)"
+        )
+
+
+LEGACY_LABEL_PAT: str = r"Assessment (\w*) Test ([\w\s]*) Domain ([\w\s-]*) Skill ([\w\s,:-]*) D"
+LEGACY_ANSWER_PATS: list[str] = [
+    r"Correct Answer:[\s]([A-Za-z0-9.\/-]+)",
+    r"Choice ([ABCDE]{1}) is correct\.",
+    r"The correct answer is ([A-Za-z0-9.\/-]+)\.",
+    r"The correct answer is either ([A-Za-z0-9.\/, -]+)\.",
+]
+
+
+def legacy_question_regexes(text: str) -> None:
+    re.findall(Q_ID_PAT, text)
+    labels_start_ind: int = text.find("Assessment")
+    label_infos = " ".join(text[labels_start_ind:].split())
+    re.findall(LEGACY_LABEL_PAT, label_infos)
+
+
+def legacy_answer_regexes(text: str) -> None:
+    re.findall(Q_ID_PAT, text)
+    for pattern in LEGACY_ANSWER_PATS:
+        if len(re.findall(pattern, text)) > 0:
+            break
+
+
+def bench_regex(paths: list[str]) -> None:
+    # NOTE: Page texts are extracted up front; this only times the regex work on them
+    texts: list[str] = []
+    for path in paths:
+        doc: Document = fitz.open(path)
+        for page_ind in range(len(doc)):
+            text = doc.load_page(page_ind).get_text()
+            assert isinstance(text, str)
+            texts.append(text)
+
+    rounds: int = 5
+    print(f"Regex field extraction over {len(texts)} pages x {rounds} (us / page):")
+    for name, legacy_fn, engine_fn in [
+        ("question", legacy_question_regexes, prepare.extract_question_fields),
+        ("answer", legacy_answer_regexes, prepare.extract_answer_fields),
+    ]:
+        results: list[float] = []
+        for fn in [legacy_fn, engine_fn]:
+            start = time.perf_counter()
+            for _ in range(rounds):
+                for text in texts:
+                    fn(text)
+            results.append((time.perf_counter() - start) * 1e6 / (rounds * len(texts)))
+
+        legacy_us, engine_us = results
+        print(
+            f"    {name:10} legacy {legacy_us:8.2f}  engine {engine_us:8.2f}  "
+            f"({legacy_us / engine_us:.2f}x)"
+        )
+
+
+def legacy_import_q_parsed_info(path: str) -> list[prepare.QInfo]:
+    # NOTE: The old row-by-row importer (scalar all_df[col][i] lookups), kept for comparison
+    all_df = pd.read_csv(path)
+    q_infos: list[prepare.QInfo] = []
+    for i in range(len(all_df)):
+        pages_str = str(all_df["Pages"][i]).split(prepare.PAGE_DELIMITER)
+        pg_inds: list[int] = [int(pg_no_str) - 1 for pg_no_str in pages_str]
+        q_id, test, domain = all_df["ID"][i], all_df["Test"][i], all_df["Domain"][i]
+        level, skill, src_pdf = all_df["Difficulty"][i], all_df["Skill"][i], all_df["Source_PDF"][i]
+        excluded = bool(all_df["Excluded"][i])
+        for value in [q_id, test, domain, level, skill, src_pdf]:
+            assert isinstance(value, str)
+        q_infos.append(prepare.QInfo(q_id, test, domain, level, skill, src_pdf, pg_inds, excluded))
+
+    return q_infos
+
+
+def legacy_import_a_parsed_info(path: str) -> list[prepare.AnsInfo]:
+    all_df = pd.read_csv(path)
+    a_infos: list[prepare.AnsInfo] = []
+    for i in range(len(all_df)):
+        pages_str = all_df["Pages"][i]
+        assert isinstance(pages_str, str)
+        pg_inds: list[int] = [int(pg_ind) - 1 for pg_ind in pages_str.split(prepare.PAGE_DELIMITER)]
+        q_id, answer, ans_src_pdf = all_df["ID"][i], all_df["Answer"][i], all_df["Answer_PDF"][i]
+        for value in [q_id, answer, ans_src_pdf]:
+            assert isinstance(value, str)
+        a_infos.append(prepare.AnsInfo(q_id, answer, ans_src_pdf, pg_inds))
+
+    return a_infos
+
+
+def bench_import(q_csv: str, a_csv: str) -> None:
+    rounds: int = 5
+    print(f"Parsed csv import (ms / import, best of {rounds}):")
+    for csv_path, legacy_fn, new_fn in [
+        (q_csv, legacy_import_q_parsed_info, prepare.import_q_parsed_info),
+        (a_csv, legacy_import_a_parsed_info, prepare.import_a_parsed_info),
+    ]:
+        results: list[float] = []
+        for fn in [legacy_fn, new_fn]:
+            best = float("inf")
+            for _ in range(rounds):
+                start = time.perf_counter()
+                infos = fn(csv_path)
+                best = min(best, (time.perf_counter() - start) * 1000)
+            results.append(best)
+
+        assert [vars(info) for info in legacy_fn(csv_path)] == [vars(info) for info in infos]
+
+        legacy_ms, new_ms = results
+        read_ms = min(timeit_ms(lambda: pd.read_csv(csv_path)) for _ in range(rounds))
+        print(
+            f"    {os.path.basename(csv_path):20} legacy {legacy_ms:8.2f}  "
+            f"vectorized {new_ms:8.2f}  ({legacy_ms / new_ms:.2f}x; read_csv alone {read_ms:.2f})"
+        )
+
+
+def timeit_ms(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000
+
+
+def traced_mib(fn):
+    tracemalloc.start()
+    result = fn()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size / (1 << 20)
+
+
+def bench_memory(q_csv: str) -> None:
+    # NOTE: Only what is still alive after loading counts (i.e. not the read_csv temporaries)
+    q_infos, list_mib = traced_mib(lambda: prepare.import_q_parsed_info(q_csv))
+
+    bank_path: str = os.path.join(tempfile.mkdtemp(), "bank.npz")
+    prepare.QuestionBank.from_q_infos(q_infos).save(bank_path)
+    bank, bank_mib = traced_mib(lambda: prepare.QuestionBank.load(bank_path))
+
+    rounds: int = 5
+    scan_results: list[float] = []
+    for container in [q_infos, bank]:
+        start = time.perf_counter()
+        for _ in range(rounds):
+            sum(1 for q in container if not q.excluded and q.level == "hard")
+        scan_results.append((time.perf_counter() - start) * 1000 / rounds)
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        int(np.count_nonzero(
+            ~bank.excluded & (bank.codes["level"] == bank.categories["level"].index("hard"))
+        ))
+    column_ms = (time.perf_counter() - start) * 1000 / rounds
+
+    print(f"Question store for {len(q_infos)} questions:")
+    print(f"    list[QInfo]    {list_mib:7.3f} MiB  row scan {scan_results[0]:7.3f} ms")
+    print(f"    QuestionBank   {bank_mib:7.3f} MiB  row scan {scan_results[1]:7.3f} ms  column scan {column_ms:7.3f} ms")
+
+
+def scaled_bank(
+    q_infos: list[prepare.QInfo], a_infos: list[prepare.AnsInfo], factor: int
+) -> tuple[list[prepare.QInfo], list[prepare.AnsInfo]]:
+    # NOTE: Synthetic bank 'factor' times the size of the real one; copy k of every question
+    #       gets a "-k" suffix on its id so that all ids stay unique.
+    scaled_qs: list[prepare.QInfo] = []
+    scaled_as: list[prepare.AnsInfo] = []
+    for k in range(factor):
+        suffix = f"-{k}" if k > 0 else ""
+        scaled_qs.extend(replace(q, q_id=q.q_id + suffix, pg_inds=list(q.pg_inds)) for q in q_infos)
+        scaled_as.extend(replace(a, q_id=a.q_id + suffix) for a in a_infos)
+
+    return scaled_qs, scaled_as
+
+
+def legacy_lookup(qg, chosen_set: list[str]) -> list[tuple[str, str]]:
+    chosen_qs = []
+    for q in qg.q_infos:
+        if q.excluded:
+            continue
+        for id in chosen_set:
+            if id == q.q_id:
+                chosen_qs.append(q)
+                break
+
+    ans_list: list[tuple[str, str]] = []
+    for chosen in chosen_qs:
+        for a_info in qg.a_infos:
+            if a_info.q_id == chosen.q_id:
+                ans_list.append((a_info.q_id, a_info.answer))
+
+    return ans_list
+
+
+def indexed_lookup(qg, chosen_set: list[str]) -> list[tuple[str, str]]:
+    return qg.answers_for(qg.q_infos_from_ids(chosen_set))
+
+
+def bench_lookup(q_csv: str, a_csv: str) -> None:
+    import generate
+
+    q_infos = prepare.import_q_parsed_info(q_csv)
+    a_infos = prepare.import_a_parsed_info(a_csv)
+    rng = random.Random(0)
+
+    print("Chosen id -> question -> answer lookup (ms / qset):")
+    for factor in [1, 4, 16]:
+        # NOTE: QGeneration.__init__ would load the csvs again, so fill it in by hand
+        qg = generate.QGeneration.__new__(generate.QGeneration)
+        scaled_qs, qg.a_infos = scaled_bank(q_infos, a_infos, factor)
+        qg.q_infos = prepare.QuestionBank.from_q_infos(scaled_qs)
+        qg.index_q_infos()
+        qg.index_a_infos()
+
+        for set_size in [20, 100]:
+            chosen_set = rng.sample(qg.q_infos.ids, set_size)
+            results: list[float] = []
+            for fn in [legacy_lookup, indexed_lookup]:
+                start = time.perf_counter()
+                ans_list = fn(qg, chosen_set)
+                results.append((time.perf_counter() - start) * 1000)
+
+            assert ans_list == legacy_lookup(qg, chosen_set)
+            legacy_ms, indexed_ms = results
+            print(
+                f"    bank {len(scaled_qs):6}  set {set_size:4}  legacy {legacy_ms:9.2f}  "
+                f"indexed {indexed_ms:7.3f}  ({legacy_ms / indexed_ms:.0f}x)"
+            )
+
+
+def legacy_sample(qdf: pd.DataFrame, spec: dict) -> list[str]:
+    # NOTE: The old DataFrame based gather_possible_set + sampling loop (skill filters only)
+    pools: list[pd.DataFrame] = []
+    for subject in ["Reading and Writing", "Math"]:
+        pool = pd.DataFrame(columns=qdf.columns)
+        for domain, dom_filter in spec.get(subject, {}).items():
+            for skill in dom_filter:
+                pool = pd.concat([pool, qdf[(qdf["Domain"] == domain) & (qdf["Skill"] == skill)]])
+        pools.append(pool)
+
+    df = pd.concat(pools, ignore_index=True)
+    df = df[df["Excluded"] == False]
+    df["rand_wt"] = np.zeros(len(df), dtype=np.float64)
+    for dif, prob in spec["prob"].items():
+        df.loc[df["Difficulty"] == dif, "rand_wt"] = prob
+
+    chosen_ids: list[str] = []
+    debug_df = pd.DataFrame(columns=qdf.columns)
+    for subject in ["Reading and Writing", "Math"]:
+        for domain, dom_filter in spec.get(subject, {}).items():
+            for skill, sk_filter in dom_filter.items():
+                f_rows = df[df["Skill"] == skill].sample(n=sk_filter, weights="rand_wt", replace=False)
+                debug_df = pd.concat([debug_df, f_rows], ignore_index=True)
+                chosen_ids.extend(f_rows["ID"])
+
+    return chosen_ids
+
+
+def indexed_sample(qg, spec: dict) -> list[str]:
+    bank = qg.q_infos
+    pool = np.concatenate([qg.gather_possible_set(subject, spec) for subject in ["Reading and Writing", "Math"]])
+    pool = pool[~bank.excluded[pool]]
+    level_wts = np.array([spec["prob"].get(level, 0.0) for level in bank.categories["level"]])
+    pool_wts = level_wts[bank.codes["level"][pool]]
+
+    chosen_ids: list[str] = []
+    for subject in ["Reading and Writing", "Math"]:
+        for domain, dom_filter in spec.get(subject, {}).items():
+            for skill, sk_filter in dom_filter.items():
+                chosen_ids.extend(qg.sample_pool(pool, pool_wts, "skill", skill, sk_filter))
+
+    return chosen_ids
+
+
+def bench_sampling(q_csv: str) -> None:
+    import generate
+
+    qg = generate.QGeneration.__new__(generate.QGeneration)
+    qg.q_infos = prepare.QuestionBank.from_q_infos(prepare.import_q_parsed_info(q_csv))
+    qg.index_taxonomy()
+    qdf: pd.DataFrame = qg.q_infos.to_df()
+
+    # One filter entry per skill in the bank, i.e. the worst case for the old code
+    spec: dict = {"prob": {"easy": 0.2, "medium": 0.3, "hard": 0.5}}
+    skill_count: int = 0
+    for test, domains in qg.tax_index.items():
+        spec[test] = {}
+        for domain, skills in domains.items():
+            spec[test][domain] = {}
+            for skill in skills:
+                available = qg.tax_positions(test, domain, skill)
+                available = available[~qg.q_infos.excluded[available]]
+                if len(available) >= 2:
+                    spec[test][domain][skill] = 2
+                    skill_count += 1
+
+    results: list[float] = []
+    chosen: list[list[str]] = []
+    for fn, arg in [(legacy_sample, qdf), (indexed_sample, qg)]:
+        np.random.seed(0)
+        start = time.perf_counter()
+        chosen.append(fn(arg, spec))
+        results.append((time.perf_counter() - start) * 1000)
+
+    assert chosen[0] == chosen[1], "Both samplers should draw the same questions"
+    legacy_ms, indexed_ms = results
+    print(f"Gather + weighted sampling with {skill_count} skill filters (ms / qset):")
+    print(f"    legacy {legacy_ms:8.2f}  indexed {indexed_ms:8.2f}  ({legacy_ms / indexed_ms:.1f}x)")
+
+
+# NOTE: Bump this whenever what a suite result measures changes, so that old results are not
+#       compared against new ones
+SUITE_VERSION: int = 1
+# Whole file parses are the noisiest stages (and few rounds of them are affordable)
+FILE_STAGE_ROUNDS: int = 7
+# NOTE: Slowdowns smaller than this (in ms, per unit) are never counted as regressions; below it
+#       the differences between two runs of the same code are mostly timer and scheduling noise
+NOISE_FLOOR_MS: float = 0.02
+
+
+def reference_ms(rounds: int = 5) -> float:
+    # Best time of a fixed bit of work. Timed right next to every stage, so that compare_suites
+    # can tell the machine being slower at the time (other load, cpu steal on a vm, frequency
+    # scaling) apart from the stage itself getting slower.
+    times: list[float] = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        sum(i * i for i in range(100_000))
+        times.append((time.perf_counter() - start) * 1000)
+
+    return min(times)
+
+
+def measure(fn, rounds: int = 5, per: int = 1, setup=None) -> dict:
+    # Times 'rounds' calls of fn; the times are divided by 'per' (i.e. the page count). If given,
+    # setup() runs (untimed) before every call and fn gets what it returns.
+    times: list[float] = []
+    reference: float = reference_ms()
+    for _ in range(rounds):
+        args: tuple = () if setup is None else (setup(),)
+        start = time.perf_counter()
+        fn(*args)
+        times.append((time.perf_counter() - start) * 1000 / per)
+
+    return {
+        "median_ms": statistics.median(times),
+        "min_ms": min(times),
+        "rounds": rounds,
+        "per": per,
+        "reference_ms": min(reference, reference_ms()),
+    }
+
+
+def suite_meta() -> dict:
+    try:
+        git_rev: str = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        git_rev = ""
+
+    return {
+        "suite_version": SUITE_VERSION,
+        "run_at": str(dt.datetime.now()),
+        "git_rev": git_rev,
+        "python": platform.python_version(),
+        "pymupdf": fitz.VersionBind,
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "cpus": os.cpu_count(),
+    }
+
+
+def difficulty_pass(doc: Document, extracts: list[prepare.PageExtract], drawing_only: bool) -> None:
+    xref_counts: dict[int, int] = {}
+    for extract in extracts:
+        prepare.get_difficulty(doc, extract, drawing_only, xref_counts)
+
+
+def suite_page_stages(results: dict, q_paths: list[str], a_paths: list[str]) -> None:
+    for path in q_paths + a_paths:
+        name: str = os.path.basename(path)
+        doc: Document = fitz.open(path)
+        pages: list[Page] = [doc.load_page(page_ind) for page_ind in range(len(doc))]
+
+        results[f"page/is_page_empty/{name}"] = measure(
+            lambda: [prepare.is_page_empty(page) for page in pages], per=len(pages)
+        )
+
+        texts: list[str] = [page.get_text() for page in pages]
+        extract_fn = prepare.extract_answer_fields if path in a_paths else prepare.extract_question_fields
+        results[f"page/regex/{name}"] = measure(
+            lambda: [extract_fn(text) for text in texts], per=len(pages)
+        )
+
+        if path in a_paths:
+            continue
+
+        id_pages: list[Page] = [
+            page for page, text in zip(pages, texts) if len(re.findall(Q_ID_PAT, text)) == 1
+        ]
+        for mode, drawing_only in [("drawings", True), ("images", False)]:
+            # NOTE: Fresh page extracts (their drawings/images are cached) and a fresh xref cache
+            #       every round, the same as for every parsed file
+            results[f"page/get_difficulty[{mode}]/{name}"] = measure(
+                lambda extracts: difficulty_pass(doc, extracts, drawing_only),
+                per=len(id_pages),
+                setup=lambda: [prepare.PageExtract(page) for page in id_pages],
+            )
+
+
+def suite_file_stages(results: dict, q_paths: list[str], a_paths: list[str]) -> None:
+    for path in q_paths:
+        results[f"file/parse_question_pdf/{os.path.basename(path)}"] = measure(
+            lambda: prepare.parse_question_pdf(path, False), rounds=FILE_STAGE_ROUNDS
+        )
+
+    for path in a_paths:
+        results[f"file/parse_answer_pdf/{os.path.basename(path)}"] = measure(
+            lambda: prepare.parse_answer_pdf(path), rounds=FILE_STAGE_ROUNDS
+        )
+
+
+def available_spec(qg, per_skill: int) -> dict:
+    # A filter asking for 'per_skill' questions of every skill whose source pdf is bundled
+    spec: dict = {"prob": {"easy": 0.3, "medium": 0.4, "hard": 0.3}}
+    bank = qg.q_infos
+    for test, domains in qg.tax_index.items():
+        for domain, skills in domains.items():
+            for skill in skills:
+                available = qg.tax_positions(test, domain, skill)
+                available = available[~bank.excluded[available]]
+                if len(available) < per_skill:
+                    continue
+                if not all(os.path.exists(bank.category("src_pdf", ind)) for ind in available):
+                    continue
+                spec.setdefault(test, {}).setdefault(domain, {})[skill] = per_skill
+
+    return spec
+
+
+def write_responses(key_csv: str, out_dir: str, students: int) -> None:
+    # NOTE: Every student gets a random mix of right, wrong and blank answers
+    rng = random.Random(0)
+    key_df = pd.read_csv(key_csv, dtype=str, keep_default_na=False)
+    os.makedirs(out_dir, exist_ok=True)
+    for student in range(students):
+        answers = [
+            ans if r < 0.6 else ("" if r < 0.7 else rng.choice(["A", "B", "C", "D"]))
+            for ans, r in zip(key_df["Answers"], (rng.random() for _ in range(len(key_df))))
+        ]
+        key_df.assign(Answers=answers).to_csv(
+            os.path.join(out_dir, f"student-{student:03}.csv"), index=False
+        )
+
+
+def suite_bank_stages(
+    results: dict, q_csv: str, a_csv: str, scales: list[int], work_dir: str
+) -> None:
+    import generate
+
+    q_infos = prepare.import_q_parsed_info(q_csv)
+    a_infos = prepare.import_a_parsed_info(a_csv)
+
+    for factor in scales:
+        scaled_qs, scaled_as = scaled_bank(q_infos, a_infos, factor)
+        tag: str = f"x{factor}"
+
+        scaled_q_csv: str = os.path.join(work_dir, f"q-{tag}.csv")
+        prepare.q_infos_to_df(scaled_qs).to_csv(scaled_q_csv, index=False)
+        results[f"bank/import_q_parsed_info/{tag}"] = measure(
+            lambda: prepare.import_q_parsed_info(scaled_q_csv)
+        )
+
+        # NOTE: QGeneration.__init__ would load the bundled csvs, so fill it in by hand
+        qg = generate.QGeneration.pdf_only(fragment_dir=os.path.join(work_dir, "no-fragments"))
+        qg.q_infos = prepare.QuestionBank.from_q_infos(scaled_qs)
+        qg.a_infos = scaled_as
+        qg.index_q_infos()
+        qg.index_taxonomy()
+        qg.index_a_infos()
+
+        spec: dict = available_spec(qg, per_skill=10)
+        spec.update({"cohort": work_dir, "folder": tag, "filename": "set"})
+        np.random.seed(0)
+        for subject in ["Reading and Writing", "Math"]:
+            # Nothing to time if the spec does not ask for the subject (it just returns None)
+            if subject not in spec:
+                continue
+            results[f"bank/gather_possible_set[{subject}]/{tag}"] = measure(
+                lambda: qg.gather_possible_set(subject, spec)
+            )
+
+        chosen_qs = qg.choose_question_set(spec)
+        results[f"bank/gen_pdf_from_q_infos/{tag}"] = measure(
+            lambda: qg.gen_pdf_from_q_infos(chosen_qs)
+        )
+        results[f"bank/gen_pdf_from_q_infos/{tag}"]["questions"] = len(chosen_qs)
+        results[f"bank/create_question_set_v2/{tag}"] = measure(
+            lambda: qg.create_question_set_v2(spec)
+        )
+
+        key_csv: str = os.path.join(work_dir, tag, "set-key.csv")
+        responses_dir: str = os.path.join(work_dir, tag, "responses")
+        write_responses(key_csv, responses_dir, students=200)
+        first_response: str = os.path.join(responses_dir, "student-000.csv")
+        results[f"bank/check_answers/{tag}"] = measure(
+            lambda: qg.check_answers(first_response, key_csv)
+        )
+        results[f"bank/grade_batch[200]/{tag}"] = measure(
+            lambda: qg.grade_batch(responses_dir, key_csv, os.path.join(work_dir, tag, "results")),
+            rounds=FILE_STAGE_ROUNDS,
+        )
+
+
+def run_suite(out_json: str, scales: list[int]) -> dict:
+    q_paths: list[str] = bundled_q_pdfs(with_excluded=True)
+    a_paths: list[str] = bundled_a_pdfs()
+    results: dict[str, dict] = {}
+
+    # NOTE: The stages print their own progress (i.e. "Saving N questions..."); only the
+    #       summary below is of interest
+    work_dir: str = tempfile.mkdtemp(prefix="bench-")
+    stdout = sys.stdout
+    try:
+        sys.stdout = io.StringIO()
+        for stage_fn, args in [
+            (suite_page_stages, (results, q_paths, a_paths)),
+            (suite_file_stages, (results, q_paths, a_paths)),
+            (suite_bank_stages, (results, "all-q-parsed.csv", "all-a-parsed.csv", scales, work_dir)),
+        ]:
+            start = time.perf_counter()
+            stage_fn(*args)
+            print(f"{stage_fn.__name__}: {time.perf_counter() - start:.1f} s", file=sys.stderr)
+    finally:
+        sys.stdout = stdout
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    run: dict = {"meta": suite_meta(), "results": results}
+    with open(out_json, "w") as f:
+        json.dump(run, f, indent=4)
+
+    print(f"{'stage':72} {'median ms':>10} {'min ms':>10}")
+    for name, result in results.items():
+        print(f"{name:72} {result['median_ms']:10.3f} {result['min_ms']:10.3f}")
+    print(f"\nComplete! Wrote {len(results)} results to '{out_json}'")
+
+    return run
+
+
+def compare_suites(
+    old_json: str, new_json: str, threshold: float = 0.1, noise_ms: float = NOISE_FLOOR_MS
+) -> bool:
+    # NOTE: A stage only counts as a regression if both its median and its best time got more than
+    #       'threshold' slower, and the best time by more than 'noise_ms'; a single slow round (or
+    #       a fraction of a microsecond on a tiny stage) is not enough. Both are first scaled by
+    #       how much slower the machine itself was when the stage ran (see reference_ms). Returns
+    #       whether there was none.
+    with open(old_json, "r") as f:
+        old: dict = json.load(f)
+    with open(new_json, "r") as f:
+        new: dict = json.load(f)
+
+    if old["meta"]["suite_version"] != new["meta"]["suite_version"]:
+        print(
+            f"WARN: Comparing suite version {old['meta']['suite_version']} against "
+            f"{new['meta']['suite_version']}; the stages may not measure the same thing"
+        )
+
+    regressions: int = 0
+    print(f"{'stage':72} {'old ms':>10} {'new ms':>10} {'median':>7} {'min':>7}")
+    for name, new_result in new["results"].items():
+        old_result: dict | None = old["results"].get(name)
+        if old_result is None:
+            print(f"{name:72} {'-':>10} {new_result['median_ms']:10.3f} {'new':>7}")
+            continue
+
+        machine_ratio: float = 1.0
+        if "reference_ms" in old_result and "reference_ms" in new_result:
+            machine_ratio = new_result["reference_ms"] / old_result["reference_ms"]
+        median_ratio: float = (
+            new_result["median_ms"] / max(old_result["median_ms"], 1e-9) / machine_ratio
+        )
+        min_ratio: float = new_result["min_ms"] / max(old_result["min_ms"], 1e-9) / machine_ratio
+        flag: str = ""
+        if (median_ratio > 1 + threshold
+            and min_ratio > 1 + threshold
+            and new_result["min_ms"] / machine_ratio - old_result["min_ms"] > noise_ms):
+            flag = "  <-- regression"
+            regressions += 1
+        print(
+            f"{name:72} {old_result['median_ms']:10.3f} {new_result['median_ms']:10.3f} "
+            f"{median_ratio:6.2f}x {min_ratio:6.2f}x{flag}"
+        )
+
+    for name in old["results"].keys() - new["results"].keys():
+        print(f"{name:72} {old['results'][name]['median_ms']:10.3f} {'-':>10} {'gone':>7}")
+
+    print(
+        f"\n{regressions} regression(s) over {threshold:.0%} and {noise_ms} ms "
+        f"({old_json} -> {new_json})"
+    )
+    return regressions == 0
+
+
+def usage(program: str) -> None:
+    print(f"USAGE: {program} <BENCHMARK> [PDFS...]\n")
+    print("Benchmarks:")
+    print("    pages       |  Per-page text/image/drawing extraction in the parser hot loop")
+    print("    difficulty  |  Difficulty detection (header drawings + cached image fallback)")
+    print("    regex       |  Question/answer field regexes on already extracted page text")
+    print("    import      |  import_q_parsed_info/import_a_parsed_info on the parsed csvs")
+    print("    memory      |  list[QInfo] vs columnar QuestionBank (memory and scans)")
+    print("    lookup      |  Chosen id to question/answer lookup on real and scaled-up banks")
+    print("    sampling    |  Candidate gathering + weighted sampling for a many-skill request")
+    print("    suite       |  Every parse/generate/grade stage; results go to a json (default bench.json)")
+    print("    [OUT_JSON]  |    [--scale N ...]: also run the bank stages on N times bigger banks")
+    print("    compare     |  Compare two suite jsons and flag stages that got slower")
+    print("    <OLD> <NEW> |    [--threshold F]: slowdown that counts as a regression (default 0.1)")
+    print(f"                |    [--noise-ms MS]: smaller slowdowns never count (default {NOISE_FLOOR_MS})")
+
+
+if __name__ == "__main__":
+    program: str = sys.argv[0]
+    if len(sys.argv) == 1:
+        usage(program)
+        sys.exit(1)
+
+    bench: str = sys.argv[1]
+    paths: list[str] = sys.argv[2:]
+
+    match bench:
+        case "pages":
+            bench_page_pass(paths or bundled_q_pdfs())
+
+        case "difficulty":
+            bench_difficulty(paths or bundled_q_pdfs(with_excluded=True))
+
+        case "regex":
+            bench_regex(paths or bundled_q_pdfs(with_excluded=True) + bundled_a_pdfs())
+
+        case "import":
+            if len(paths) not in [0, 2]:
+                print("ERROR: provide both the question and answer csvs (or neither).")
+                sys.exit(1)
+
+            bench_import(*(paths or ["all-q-parsed.csv", "all-a-parsed.csv"]))
+
+        case "lookup":
+            if len(paths) not in [0, 2]:
+                print("ERROR: provide both the question and answer csvs (or neither).")
+                sys.exit(1)
+
+            bench_lookup(*(paths or ["all-q-parsed.csv", "all-a-parsed.csv"]))
+
+        case "sampling":
+            bench_sampling(paths[0] if paths else "all-q-parsed.csv")
+
+        case "memory":
+            bench_memory(paths[0] if paths else "all-q-parsed.csv")
+
+        case "suite":
+            scales: list[int] = [1]
+            if "--scale" in paths:
+                scale_ind: int = paths.index("--scale")
+                scales = [int(scale) for scale in paths[scale_ind + 1:]]
+                paths = paths[:scale_ind]
+
+            if len(paths) > 1 or len(scales) == 0:
+                print("ERROR: provide at most the output json and then '--scale N ...'.")
+                sys.exit(1)
+
+            run_suite(paths[0] if paths else "bench.json", scales)
+
+        case "compare":
+            options: dict[str, float] = {"--threshold": 0.1, "--noise-ms": NOISE_FLOOR_MS}
+            for option in options:
+                if option in paths and paths.index(option) + 1 < len(paths):
+                    option_ind: int = paths.index(option)
+                    options[option] = float(paths[option_ind + 1])
+                    paths = paths[:option_ind] + paths[option_ind + 2:]
+
+            if len(paths) != 2:
+                print(
+                    "ERROR: provide the old and new suite jsons "
+                    "(and optionally '--threshold F' and '--noise-ms MS')."
+                )
+                sys.exit(1)
+
+            if not compare_suites(paths[0], paths[1], options["--threshold"], options["--noise-ms"]):
+                sys.exit(1)
+
+        case _:
+            usage(program)
+            print(f"\nERROR: Unknown benchmark: '{bench}'")
@@ -1,21 +1,89 @@
+from __future__ import annotations
+
+import importlib
 import json
 import math
 import os
 import random
-import re
 import sys
-from pathlib import Path
-from typing import Literal
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Literal
+
+if TYPE_CHECKING:
+    from concurrent.futures import Future, ProcessPoolExecutor
+
+    import fitz
+    import numpy as np
+    import pandas as pd
+    from pymupdf import Document
+
+    import prepare
+    from prepare import AnsInfo, Level, QInfo
+
 
-import fitz
-import numpy as np
-import pandas as pd
-from pymupdf import Document
+# NOTE: Anything that is not needed by every mode gets imported where it is used (same as
+#       'service' for the serve mode), so that modes like 'help', 'allids' and 'skilltree' start
+#       up without paying for it. Importing numpy, pandas and fitz (directly or through prepare)
+#       alone takes the better part of a second.
+class LazyModule:
+    # NOTE: Stands in for a module until one of its attributes is first used
+    def __init__(self, name: str) -> None:
+        self._name: str = name
+        self._module = None
 
-import prepare
-from prepare import AnsInfo, Level, QInfo
+    def __getattr__(self, attr: str):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+if not TYPE_CHECKING:
+    fitz = LazyModule("fitz")
+    np = LazyModule("numpy")
+    pd = LazyModule("pandas")
+    prepare = LazyModule("prepare")
 
 Subject = Literal["Reading and Writing", "Math"]
+# Most source pdfs kept open at once by a QGeneration (least recently used get closed first)
+MAX_OPEN_SRC_PDFS: int = 16
+FRAGMENT_STORE_DIR: str = "./q-fragments"
+# doc.save() options of every save profile; a qset picks one with "saveProfile" in its input json
+SAVE_PROFILES: dict[str, dict] = {
+    # Same as a plain doc.save(): nothing is collected or compressed
+    "fast": {},
+    # NOTE: garbage=4 also merges objects with identical streams, i.e. the copies of the same
+    #       fonts and images that every question inserted from the same source pdf brings along
+    "compact": {
+        "garbage": 4,
+        "deflate": True,
+        "deflate_images": True,
+        "deflate_fonts": True,
+        "use_objstms": 1,
+    },
+}
+DEFAULT_SAVE_PROFILE: str = "fast"
+ANSWER_CSV_HEADER: list[str] = ["No.", "Question ID", "Answers"]
+# NOTE: The id list and both skill trees ('allids', 'skilltree' and the service's /allids and
+#       /skilltree) only change when the bank does, so 'parse' writes them out once as artifacts
+#       named after a hash of their content; the hash doubles as their ETag. Serving them is just
+#       a file read. Only if they are missing or older than the parsed csv when asked for do they
+#       get rebuilt (see read_artifact). Every bank csv gets a directory of its own in here.
+ARTIFACTS_DIR: str = "./artifacts"
+ARTIFACTS_INDEX_NAME: str = "index.json"
+ARTIFACTS_VERSION: int = 1
+# NOTE: Sets asked for with a 'seed' are drawn the same way every time, so what was generated for
+#       them is kept (least recently used go first once the cache outgrows its size) and handed
+#       out again for the same spec, seed and bank instead of being rebuilt.
+QSET_CACHE_DIR: str = "./qset-cache"
+QSET_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+QSET_CACHE_VERSION: int = 2
+# Suffix (after the set's name) of each file of a set -> its name in a cache entry
+QSET_CACHE_FILES: dict[str, str] = {
+    ".pdf": "set.pdf",
+    "-key.csv": "set-key.csv",
+    "-empty.csv": "set-empty.csv",
+}
 
 
 class QGeneration:
@@ -23,35 +91,117 @@ class QGeneration:
         self,
         q_parsed_path: str = "./all-q-parsed.csv",
         a_parsed_path: str = "./all-a-parsed.csv",
+        fragment_dir: str = FRAGMENT_STORE_DIR,
+        load_questions: bool = True,
+        load_answers: bool = True,
     ) -> None:
-        try:
-            self.q_infos: list[QInfo] = prepare.import_q_parsed_info(q_parsed_path)
-        except:
-            print(
-                f"ERROR: Could not find {q_parsed_path}; question information loading failed..."
-            )
-            print("WARN: Either regenerate the parsed csv or find the parsed csv path")
-
-        try:
-            self.a_infos: list[AnsInfo] = prepare.import_a_parsed_info(a_parsed_path)
-        except:
-            print(
-                f"ERROR: Could not find {a_parsed_path}; answer information loading failed..."
-            )
-            print("WARN: Either regenerate the parsed csv or find the parsed csv path")
-
-        self.qdf: pd.DataFrame = prepare.q_infos_to_df(self.q_infos)
+        self.q_parsed_path: str = q_parsed_path
+        self.a_parsed_path: str = a_parsed_path
+        self.bank_tag: str | None = None
+        # None: seeded sets don't get cached (see qset_cache_key)
+        self.qset_cache_dir: str | None = QSET_CACHE_DIR
+        self.qset_cache_max_bytes: int = QSET_CACHE_MAX_BYTES
+        # NOTE: When set (see service.serve), the pdfs of single sets get assembled by these worker
+        #       processes instead of this one, so that several can be put together at once
+        self.pdf_pool: ProcessPoolExecutor | None = None
+        self.init_src_pdfs(fragment_dir)
+        # answer text -> the responses it accepts
+        self.answer_norms: dict[str, prepare.NormAnswer] = {}
+
+        if load_questions:
+            try:
+                self.q_infos: prepare.QuestionBank = prepare.load_question_bank(q_parsed_path)
+                self.index_q_infos()
+                self.index_taxonomy()
+            except:
+                print(
+                    f"ERROR: Could not find {q_parsed_path}; question information loading failed..."
+                )
+                print("WARN: Either regenerate the parsed csv or find the parsed csv path")
+
+        if load_answers:
+            try:
+                self.a_infos: list[AnsInfo] = prepare.import_a_parsed_info(a_parsed_path)
+                self.index_a_infos()
+                self.answer_norms = prepare.load_answer_norms(a_parsed_path, self.a_infos)
+            except:
+                print(
+                    f"ERROR: Could not find {a_parsed_path}; answer information loading failed..."
+                )
+                print("WARN: Either regenerate the parsed csv or find the parsed csv path")
+
+    @classmethod
+    def pdf_only(cls, fragment_dir: str = FRAGMENT_STORE_DIR) -> "QGeneration":
+        # NOTE: An instance that has not loaded the bank; only good for gen_pdf_from_q_infos
+        #       (i.e. in the pdf assembly worker processes)
+        qg = cls.__new__(cls)
+        # NOTE: There are no parsed csvs behind whatever bank gets filled in (e.g. bench.py), so
+        #       nothing to key cached sets on; seeded sets are just built every time
+        qg.q_parsed_path = None
+        qg.a_parsed_path = None
+        qg.bank_tag = None
+        qg.qset_cache_dir = None
+        qg.qset_cache_max_bytes = QSET_CACHE_MAX_BYTES
+        qg.init_src_pdfs(fragment_dir)
+        qg.answer_norms = {}
+        qg.pdf_pool = None
+        return qg
+
+    def init_src_pdfs(
+        self, fragment_dir: str = FRAGMENT_STORE_DIR, max_open: int = MAX_OPEN_SRC_PDFS
+    ) -> None:
+        # Prebuilt per question pdfs (see prepare.build_fragment_store); empty if never built
+        self.fragment_dir: str = fragment_dir
+        self.fragment_sources: dict[str, dict] = prepare.load_fragment_index(fragment_dir)
+
+        self.max_open_src_pdfs: int = max_open
+        # path -> open document, least recently used first
+        self.src_docs: OrderedDict[str, Document] = OrderedDict()
+        # path -> per page emptiness (-1: not checked yet, 0: has content, 1: empty). These are
+        # kept even after the document itself gets closed.
+        self.src_page_empty: dict[str, np.ndarray] = {}
+
+    def index_q_infos(self) -> None:
+        # id -> positions in self.q_infos (an id can show up more than once)
+        self.q_inds_by_id: dict[str, list[int]] = {}
+        for ind, q_id in enumerate(self.q_infos.ids):
+            self.q_inds_by_id.setdefault(q_id, []).append(ind)
+
+    def norm_answer(self, answer: str) -> prepare.NormAnswer:
+        # NOTE: Answers from the bank are normalised at load; anything else (i.e. a hand edited
+        #       key) only the first time it is seen
+        norm: prepare.NormAnswer | None = self.answer_norms.get(answer)
+        if norm is None:
+            norm = prepare.normalise_answer(answer)
+            self.answer_norms[answer] = norm
+
+        return norm
+
+    def index_a_infos(self) -> None:
+        self.a_infos_by_id: dict[str, list[AnsInfo]] = {}
+        for a_info in self.a_infos:
+            self.a_infos_by_id.setdefault(a_info.q_id, []).append(a_info)
 
     def parse_pdfs(
-        self, q_out_csv: str = "all-q-parsed.csv", a_out_csv: str = "all-a-parsed.csv"
+        self,
+        q_out_csv: str = "all-q-parsed.csv",
+        a_out_csv: str = "all-a-parsed.csv",
+        jobs: int = 1,
+        page_jobs: int = 1,
+        force: bool = False,
+        fragments: bool = False,
     ) -> None:
+        from pathlib import Path
+
         file_paths: list[tuple[str, bool]] = []
         for dir_ind, dir in enumerate(["./alls/questions/", "./excludeds/questions/"]):
             for aqp in os.listdir(dir):
                 p = Path(dir) / aqp
                 file_paths.append((str(p), dir_ind == 1))
 
-        prepare.parse_all_q_pdfs(file_paths, q_out_csv)
+        prepare.parse_all_q_pdfs(
+            file_paths, q_out_csv, jobs, page_jobs, force=force
+        )
         print(f"Complete! Exported question PDFs info to '{q_out_csv}'")
 
         file_paths = []
@@ -60,10 +210,34 @@ class QGeneration:
                 p = Path(dir) / aqp
                 file_paths.append((str(p), dir_ind == 1))
 
-        prepare.parse_all_a_pdfs(file_paths, a_out_csv)
+        prepare.parse_all_a_pdfs(
+            file_paths, a_out_csv, jobs, page_jobs, force=force
+        )
         print(f"Complete! Exported answer PDFs info to '{a_out_csv}'")
 
+        bank: prepare.QuestionBank = prepare.load_question_bank(q_out_csv)
+        if os.path.normpath(q_out_csv) == os.path.normpath(self.q_parsed_path):
+            self.q_infos = bank
+            artifacts: dict[str, dict] = self.write_artifacts()
+            print(
+                f"Complete! Wrote the id list and skill trees into '{artifacts_dir_for(q_out_csv)}' "
+                f"({', '.join(artifact['file'] for artifact in artifacts.values())})"
+            )
+
+        # NOTE: Once built, the fragment store is kept in sync with every parse
+        if fragments or os.path.exists(prepare.fragment_index_path(self.fragment_dir)):
+            prepare.build_fragment_store(
+                [q for q in bank if not q.excluded], self.fragment_dir, jobs
+            )
+            self.fragment_sources = prepare.load_fragment_index(self.fragment_dir)
+            print(f"Complete! Built question fragments into '{self.fragment_dir}'")
+
     def gen_skill_tree(self, output_json: str, w_difficulty: bool = False) -> None:
+        tree: dict[str, dict[str, dict]] = self.build_skill_tree(w_difficulty)
+        with open(output_json, "w") as f:
+            json.dump(tree, f, indent=4)
+
+    def build_skill_tree(self, w_difficulty: bool = False) -> dict[str, dict[str, dict]]:
         tree: dict[str, dict[str, dict]] = {}
         for info in self.q_infos:
             if info.test not in tree.keys():
@@ -87,19 +261,14 @@ class QGeneration:
 
                 tree[info.test][info.domain][info.skill][ind] += 1
             else:
-                skill = info.skill
-
-                # NOTE: What an annoying bug. Can CollegeBoard really not make sure that they use a consistent naming mechanism? I guess it's not suprising...
-                if skill == "Cross-text Connections":
-                    skill = "Cross-Text Connections"
+                # NOTE: Skill names come out of the parser already normalised (see
+                #       prepare.SKILL_NAME_FIXES)
+                if info.skill not in tree[info.test][info.domain]:
+                    tree[info.test][info.domain][info.skill] = 0
 
-                if skill not in tree[info.test][info.domain]:
-                    tree[info.test][info.domain][skill] = 0
+                tree[info.test][info.domain][info.skill] += 1
 
-                tree[info.test][info.domain][skill] += 1
-
-        with open(output_json, "w") as f:
-            json.dump(tree, f, indent=4)
+        return tree
 
     def put_answers_on_page(
         self, doc: Document, answers: list[tuple[str, str]]
@@ -150,8 +319,7 @@ class QGeneration:
         filename = filename.strip()
 
         dir_name = os.path.join(cohort, folder)
-        if not os.path.exists(dir_name) or not os.path.isdir(dir_name):
-            os.makedirs(dir_name)
+        os.makedirs(dir_name, exist_ok=True)
 
         if not filename.endswith(".pdf"):
             filename += ".pdf"
@@ -165,23 +333,314 @@ class QGeneration:
         incl_ans_temp: bool = True,
         incl_ans_key: bool = True,
         exclude_excludeds: bool = True,
-    ) -> list[QInfo]:
-        rw_possible_df = self.gather_possible_set("Reading and Writing", input)
-        math_possible_df = self.gather_possible_set("Math", input)
+        incl_ans_page: bool = False,
+    ) -> list[prepare.QRow]:
+        cache_key: str | None = self.qset_cache_key(
+            input, incl_ans_temp, incl_ans_key, exclude_excludeds, incl_ans_page, shuffle
+        )
+        if cache_key is not None:
+            cached: tuple[list[prepare.QRow], bytes] | None = self.restore_cached_question_set(
+                cache_key, input, True, incl_ans_temp, incl_ans_key
+            )
+            if cached is not None:
+                return cached[0]
 
-        # Add column for weight (based on difficulty)
-        prob_dict: dict[Level, float] = input["prob"]
-        new_qdf = pd.concat([rw_possible_df, math_possible_df], ignore_index=True)
+        chosen_qs: list[prepare.QRow] = self.choose_question_set(input, shuffle, exclude_excludeds)
+        if len(chosen_qs) == 0:
+            return []
+
+        output_path = self.get_output_path(
+            input["cohort"], input["folder"], input["filename"]
+        )
+        ans_list: list[tuple[str, str]] = self.answers_for(chosen_qs)
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        # NOTE: The csvs get written on another thread while the pdf is being put together
+        with ThreadPoolExecutor(max_workers=1) as writer:
+            written = writer.submit(
+                self.write_answer_files,
+                input, chosen_qs, output_path, incl_ans_temp, incl_ans_key, ans_list,
+            )
+            try:
+                self.save_question_set_pdf(
+                    chosen_qs,
+                    output_path,
+                    input.get("saveProfile", DEFAULT_SAVE_PROFILE),
+                    ans_list if input.get("includeAnsPage", incl_ans_page) else None,
+                )
+            except BaseException:
+                discard_answer_files(written)
+                raise
+            written.result()
+
+        if cache_key is not None:
+            self.cache_question_set(
+                cache_key, input, chosen_qs, ans_list, output_path, incl_ans_temp, incl_ans_key
+            )
+
+        return chosen_qs
+
+    def question_set_doc(
+        self,
+        chosen_qs: list[QInfo] | list[prepare.QRow],
+        page_answers: list[tuple[str, str]] | None = None,
+    ) -> Document:
+        # The question pdf, with an answer key page at the end if 'page_answers' are given
+        doc: Document = self.gen_pdf_from_q_infos(chosen_qs)
+        if page_answers:
+            self.put_answers_on_page(doc, page_answers)
+
+        return doc
+
+    def save_question_set_pdf(
+        self,
+        chosen_qs: list[prepare.QRow],
+        output_path: str,
+        save_profile: str = DEFAULT_SAVE_PROFILE,
+        page_answers: list[tuple[str, str]] | None = None,
+    ) -> tuple[int, float]:
+        # See question_set_doc
+        if self.pdf_pool is not None:
+            return self.pdf_pool.submit(
+                _save_question_set_pdf,
+                ([q.to_q_info() for q in chosen_qs], output_path, save_profile, page_answers),
+            ).result()
+
+        return save_pdf(self.question_set_doc(chosen_qs, page_answers), output_path, save_profile)
+
+    def stream_question_set(
+        self,
+        input: dict,
+        persist: bool = False,
+        shuffle: bool = True,
+        exclude_excludeds: bool = True,
+        incl_ans_page: bool = False,
+    ) -> tuple[list[prepare.QRow], bytes]:
+        # NOTE: Same set as create_question_set_v2, but the pdf is handed back in memory (for the
+        #       service to send straight to the client) instead of being saved and read back.
+        #       Only with 'persist' do the pdf and the answer csvs also end up in cohort/folder.
+        cache_key: str | None = self.qset_cache_key(
+            input, True, True, exclude_excludeds, incl_ans_page, shuffle
+        )
+        if cache_key is not None:
+            cached: tuple[list[prepare.QRow], bytes] | None = self.restore_cached_question_set(
+                cache_key, input, persist, read_pdf=True
+            )
+            if cached is not None:
+                return cached
+
+        chosen_qs: list[prepare.QRow] = self.choose_question_set(input, shuffle, exclude_excludeds)
+        if len(chosen_qs) == 0:
+            return [], b""
+
+        ans_list: list[tuple[str, str]] = self.answers_for(chosen_qs)
+        data: bytes = self.question_set_pdf_bytes(
+            chosen_qs,
+            input.get("saveProfile", DEFAULT_SAVE_PROFILE),
+            ans_list if input.get("includeAnsPage", incl_ans_page) else None,
+        )
+
+        if cache_key is not None:
+            self.cache_question_set(cache_key, input, chosen_qs, ans_list, data)
+
+        if persist:
+            output_path = self.get_output_path(
+                input["cohort"], input["folder"], input["filename"]
+            )
+            with open(output_path, "wb") as f:
+                f.write(data)
+            self.write_answer_files(input, chosen_qs, output_path, ans_list=ans_list)
+
+        return chosen_qs, data
+
+    def start_pdf_pool(self, jobs: int, src_pdfs: list[str] | None = None) -> None:
+        # See self.pdf_pool; every worker opens 'src_pdfs' when it starts
+        from concurrent.futures import ProcessPoolExecutor
+
+        self.pdf_pool = ProcessPoolExecutor(
+            max_workers=jobs,
+            initializer=_init_pdf_worker,
+            initargs=(self.fragment_dir, src_pdfs or []),
+        )
+        # NOTE: The first task forks all the workers; done right away, before there are any other
+        #       threads (e.g. the service's request threads) around to be forked along with them
+        self.pdf_pool.submit(int).result()
+
+    def question_set_pdf_bytes(
+        self,
+        chosen_qs: list[prepare.QRow],
+        save_profile: str = DEFAULT_SAVE_PROFILE,
+        page_answers: list[tuple[str, str]] | None = None,
+    ) -> bytes:
+        # Same pdf as save_question_set_pdf, kept in memory
+        if self.pdf_pool is not None:
+            return self.pdf_pool.submit(
+                _question_set_pdf_bytes,
+                ([q.to_q_info() for q in chosen_qs], save_profile, page_answers),
+            ).result()
+
+        return pdf_to_bytes(self.question_set_doc(chosen_qs, page_answers), save_profile)
+
+    def qset_cache_key(
+        self,
+        input: dict,
+        incl_ans_temp: bool = True,
+        incl_ans_key: bool = True,
+        exclude_excludeds: bool = True,
+        incl_ans_page: bool = False,
+        shuffle: bool = True,
+    ) -> str | None:
+        # None unless the set is asked for with a 'seed' (only then is it the same every time)
+        if input.get("seed") is None or self.qset_cache_dir is None:
+            return None
+
+        import hashlib
+
+        if self.bank_tag is None:
+            self.bank_tag = ",".join(
+                prepare.file_sha256(path)[:16]
+                for path in [self.q_parsed_path, self.a_parsed_path] if os.path.exists(path)
+            )
+
+        spec: dict = canonical_qset_spec(input)
+        spec.setdefault("includeAnsTemplate", incl_ans_temp)
+        spec.setdefault("includeAnsKey", incl_ans_key)
+        spec.setdefault("includeAnsPage", incl_ans_page)
+        spec["excludeExcludeds"] = exclude_excludeds
+        spec["shuffle"] = shuffle
+
+        key_json: str = json.dumps(
+            {"version": QSET_CACHE_VERSION, "bank": self.bank_tag, "spec": spec},
+            sort_keys=True, separators=(",", ":"),
+        )
+        return hashlib.sha256(key_json.encode()).hexdigest()[:32]
+
+    def restore_cached_question_set(
+        self,
+        cache_key: str,
+        input: dict,
+        persist: bool = True,
+        incl_ans_temp: bool = True,
+        incl_ans_key: bool = True,
+        read_pdf: bool = False,
+    ) -> tuple[list[prepare.QRow], bytes] | None:
+        # The cached set and (if 'read_pdf') its pdf, with its files copied to
+        # cohort/folder/filename if 'persist'; None on a miss
+        import shutil
+
+        entry_dir: str = os.path.join(self.qset_cache_dir, cache_key)
+        try:
+            with open(os.path.join(entry_dir, "ids.json"), "r") as f:
+                q_ids: list[str] = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if persist:
+            output_path = self.get_output_path(
+                input["cohort"], input["folder"], input["filename"]
+            )
+            name_wo_ext: str = output_path.removesuffix(".pdf")
+
+        # NOTE: Another thread or process may be evicting the entry while it is read, so anything
+        #       going missing on the way counts as a miss (and the set just gets built again). What
+        #       is left of the entry goes too, or it could never be cached again.
+        try:
+            # Last used now (see evict_qset_cache)
+            os.utime(entry_dir)
+
+            data: bytes = b""
+            if read_pdf:
+                with open(os.path.join(entry_dir, QSET_CACHE_FILES[".pdf"]), "rb") as f:
+                    data = f.read()
+
+            if persist:
+                # The same files write_answer_files put in the entry
+                suffixes: list[str] = [".pdf"]
+                if input.get("includeAnsKey", incl_ans_key):
+                    suffixes.append("-key.csv")
+                if input.get("includeAnsTemplate", incl_ans_temp):
+                    suffixes.append("-empty.csv")
+
+                for suffix in suffixes:
+                    shutil.copyfile(
+                        os.path.join(entry_dir, QSET_CACHE_FILES[suffix]), name_wo_ext + suffix
+                    )
+        except OSError:
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            return None
+
+        print(f"Reused the cached set '{cache_key}' ({len(q_ids)} questions)")
+        return self.q_infos_from_ids(q_ids), data
+
+    def cache_question_set(
+        self,
+        cache_key: str,
+        input: dict,
+        chosen_qs: list[prepare.QRow],
+        ans_list: list[tuple[str, str]],
+        pdf: bytes | str,
+        incl_ans_temp: bool = True,
+        incl_ans_key: bool = True,
+    ) -> None:
+        # 'pdf' is either the pdf itself or the path it was saved to
+        import shutil
+        import tempfile
+
+        entry_dir: str = os.path.join(self.qset_cache_dir, cache_key)
+        # NOTE: Unique per process and thread (the service builds several sets at once)
+        os.makedirs(self.qset_cache_dir, exist_ok=True)
+        tmp_dir: str = tempfile.mkdtemp(prefix=f"{cache_key}.tmp-", dir=self.qset_cache_dir)
+        try:
+            pdf_path: str = os.path.join(tmp_dir, QSET_CACHE_FILES[".pdf"])
+            if isinstance(pdf, bytes):
+                with open(pdf_path, "wb") as f:
+                    f.write(pdf)
+            else:
+                shutil.copyfile(pdf, pdf_path)
+
+            self.write_answer_files(
+                input, chosen_qs, pdf_path, incl_ans_temp, incl_ans_key, ans_list
+            )
+            with open(os.path.join(tmp_dir, "ids.json"), "w") as f:
+                json.dump([q.q_id for q in chosen_qs], f)
+
+            # NOTE: Only complete entries ever show up under their key
+            os.replace(tmp_dir, entry_dir)
+        except OSError:
+            # Someone else cached the same set in the meantime
+            pass
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        evict_qset_cache(self.qset_cache_dir, self.qset_cache_max_bytes)
+
+    def choose_question_set(
+        self, input: dict, shuffle: bool = True, exclude_excludeds: bool = True
+    ) -> list[prepare.QRow]:
+        rw_possible = self.gather_possible_set("Reading and Writing", input)
+        math_possible = self.gather_possible_set("Math", input)
+
+        # NOTE: The candidate pool is a list of row positions into self.q_infos (in the same order
+        #       the old concatenated DataFrame had); filtering and sampling index into it.
+        bank: prepare.QuestionBank = self.q_infos
+        pool = np.concatenate(
+            [p for p in [rw_possible, math_possible] if p is not None] or [np.zeros(0, dtype=np.int64)]
+        )
         if exclude_excludeds:
-            new_qdf = new_qdf[new_qdf["Excluded"] == False]
+            pool = pool[~bank.excluded[pool]]
 
-        if len(new_qdf) == 0:
+        if len(pool) == 0:
             print("[WARN] 0 questions found that satiates your request")
             return []
 
-        new_qdf["rand_wt"] = np.zeros(len(new_qdf), dtype=np.float64)
+        # Weight for every candidate (based on difficulty)
+        prob_dict: dict[Level, float] = input["prob"]
+        level_wts = np.zeros(len(bank.categories["level"]), dtype=np.float64)
         for dif, prob in prob_dict.items():
-            new_qdf.loc[new_qdf["Difficulty"] == dif, "rand_wt"] = prob
+            if dif in bank.categories["level"]:
+                level_wts[bank.categories["level"].index(dif)] = prob
+        pool_wts = level_wts[bank.codes["level"][pool]]
 
         # NOTE: I know this terrible but it will do for now.
         # TODO: Refactor this (at some point...)
@@ -193,48 +652,36 @@ class QGeneration:
         #     Skill, Words in Context, 12
         #     ...
 
-        chosen_ids: list[str] = []
-        debug_df = pd.DataFrame(columns=self.qdf.columns)
+        # NOTE: With a 'seed', the draws come from generators of their own instead of the global
+        #       ones, so the same spec and seed always give the same set (see qset_cache_key)
+        seed: int | None = input.get("seed")
+        np_rng = np.random if seed is None else np.random.RandomState(seed)
+        py_rng = random if seed is None else random.Random(seed)
 
-        # Shorter alias: new_qdf <=> df
-        df = new_qdf
+        chosen_ids: list[str] = []
         for subject in ["Reading and Writing", "Math"]:
             if subject not in input:
                 continue
 
             subject_filter: int | dict = input[subject]
             if isinstance(subject_filter, int):
-                filtered = df[df["Test"] == subject]
-                f_rows = filtered.sample(
-                    n=subject_filter, weights="rand_wt", replace=False
+                chosen_ids.extend(
+                    self.sample_pool(pool, pool_wts, "test", subject, subject_filter, np_rng)
                 )
-                debug_df = pd.concat([debug_df, f_rows], ignore_index=True)
-
-                chosen_ids.extend(f_rows["ID"])
 
             elif isinstance(subject_filter, dict):
                 for domain, dom_filter in subject_filter.items():
                     if isinstance(dom_filter, int):
-                        filtered = df[df["Domain"] == domain]
-                        f_rows = filtered.sample(
-                            n=dom_filter, weights="rand_wt", replace=False
+                        chosen_ids.extend(
+                            self.sample_pool(pool, pool_wts, "domain", domain, dom_filter, np_rng)
                         )
-                        debug_df = pd.concat([debug_df, f_rows], ignore_index=True)
-
-                        chosen_ids.extend(f_rows["ID"])
                     elif isinstance(dom_filter, dict):
                         for skill, sk_filter in dom_filter.items():
                             if isinstance(sk_filter, int):
-                                filtered = df[df["Skill"] == skill]
-                                f_rows = filtered.sample(
-                                    n=sk_filter, weights="rand_wt", replace=False
-                                )
-                                debug_df = pd.concat(
-                                    [debug_df, f_rows], ignore_index=True
+                                chosen_ids.extend(
+                                    self.sample_pool(pool, pool_wts, "skill", skill, sk_filter, np_rng)
                                 )
 
-                                chosen_ids.extend(f_rows["ID"])
-
         # Specific id filtering
         if "chosenIds" in input:
             specific_ids = input["chosenIds"]
@@ -242,26 +689,29 @@ class QGeneration:
             chosen_ids.extend(specific_ids)
 
         chosen_set = list(set(chosen_ids))
+        if seed is not None:
+            # NOTE: Otherwise the order (and so the shuffle) would depend on string hashing, which
+            #       differs between processes, and on the order 'chosenIds' are listed in (which
+            #       canonical_qset_spec does not keep)
+            chosen_set.sort()
 
         if shuffle:
-            random.shuffle(chosen_set)
-
-        # Convert from id strings to QInfo
-        chosen_qs: list[QInfo] = []
-        for q in self.q_infos:
-            if q.excluded:
-                continue
-            for id in chosen_set:
-                if id == q.q_id:
-                    chosen_qs.append(q)
-                    break
+            py_rng.shuffle(chosen_set)
 
-        doc: Document = self.gen_pdf_from_q_infos(chosen_qs)
-        output_path = self.get_output_path(
-            input["cohort"], input["folder"], input["filename"]
-        )
-        doc.save(output_path)
+        # Convert from id strings to bank rows
+        return self.q_infos_from_ids(chosen_set)
 
+    def write_answer_files(
+        self,
+        input: dict,
+        chosen_qs: list[prepare.QRow],
+        output_path: str,
+        incl_ans_temp: bool = True,
+        incl_ans_key: bool = True,
+        ans_list: list[tuple[str, str]] | None = None,
+    ) -> list[str]:
+        # Returns the paths of the csvs it wrote
+        written: list[str] = []
         if "includeAnsTemplate" in input:
             incl_ans_temp = input["includeAnsTemplate"]
 
@@ -269,59 +719,228 @@ class QGeneration:
             name_wo_ext: str = output_path.removesuffix(".pdf")
             ans_template_path: str = name_wo_ext + "-empty.csv"
             self.gen_answer_template(chosen_qs, ans_template_path)
+            written.append(ans_template_path)
 
         if "includeAnsKey" in input:
             incl_ans_key = input["includeAnsKey"]
 
         if incl_ans_key:
             name_wo_ext: str = output_path.removesuffix(".pdf")
-            ans_list: list[tuple[str, str]] = []
-            for chosen in chosen_qs:
-                for a_info in self.a_infos:
-                    if a_info.q_id == chosen.q_id:
-                        ans_list.append((a_info.q_id, a_info.answer))
+            if ans_list is None:
+                ans_list = self.answers_for(chosen_qs)
 
-            # self.put_answers_on_page(doc, ans_list)
             self.export_answer_csv(ans_list, name_wo_ext + "-key.csv")
+            written.append(name_wo_ext + "-key.csv")
+
+        return written
+
+    def create_question_sets(self, inputs: list[dict], jobs: int = 1) -> list[str]:
+        # NOTE: All the sampling happens here, one set after the other (so the random draws are
+        #       the same as running each of them through create_question_set_v2); only the pdf
+        #       assembly is handed off to the worker processes.
+        start = time.perf_counter()
+        chosen_sets: list[list[prepare.QRow]] = []
+        output_paths: list[str] = []
+        for input in inputs:
+            chosen_qs: list[prepare.QRow] = self.choose_question_set(input)
+            chosen_sets.append(chosen_qs)
+            output_paths.append(
+                self.get_output_path(input["cohort"], input["folder"], input["filename"])
+            )
+
+        ans_lists: list[list[tuple[str, str]]] = [
+            self.answers_for(chosen_qs) for chosen_qs in chosen_sets
+        ]
+
+        pdf_jobs = [
+            (
+                [q.to_q_info() for q in chosen_qs],
+                output_path,
+                input.get("saveProfile", DEFAULT_SAVE_PROFILE),
+                ans_list if input.get("includeAnsPage", False) else None,
+            )
+            for input, chosen_qs, output_path, ans_list
+            in zip(inputs, chosen_sets, output_paths, ans_lists)
+            if len(chosen_qs) > 0
+        ]
 
-        return []
+        def write_all_answer_files() -> dict[str, list[str]]:
+            # output path -> the csvs written for it
+            written: dict[str, list[str]] = {}
+            for input, chosen_qs, output_path, ans_list in zip(
+                inputs, chosen_sets, output_paths, ans_lists
+            ):
+                if len(chosen_qs) > 0:
+                    written[output_path] = self.write_answer_files(
+                        input, chosen_qs, output_path, ans_list=ans_list
+                    )
+            return written
+
+        from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+        # NOTE: Same as create_question_set_v2, the csvs are written while the pdfs are assembled
+        with ThreadPoolExecutor(max_workers=1) as writer:
+            written = writer.submit(write_all_answer_files)
+            saved: set[str] = set()
+            try:
+                if jobs <= 1 or len(pdf_jobs) <= 1:
+                    for q_infos, output_path, save_profile, page_answers in pdf_jobs:
+                        save_pdf(
+                            self.question_set_doc(q_infos, page_answers), output_path, save_profile
+                        )
+                        saved.add(output_path)
+                else:
+                    with ProcessPoolExecutor(max_workers=min(jobs, len(pdf_jobs))) as pool:
+                        futures = {
+                            pool.submit(_save_question_set_pdf, pdf_job): pdf_job[1]
+                            for pdf_job in pdf_jobs
+                        }
+                        wait(futures)
+                        for future, output_path in futures.items():
+                            if future.exception() is None:
+                                saved.add(output_path)
+                        for future in futures:
+                            future.result()
+            except BaseException:
+                discard_answer_files(written, keep=saved)
+                raise
+            written.result()
+
+        elapsed = time.perf_counter() - start
+        print(
+            f"Complete! Generated {len(pdf_jobs)} question sets in {elapsed:.3f} s "
+            f"({len(pdf_jobs) / elapsed:.2f} sets/s)"
+        )
 
-    def gather_possible_set(self, subject: str, input: dict) -> pd.DataFrame | None:
+        return [path for chosen_qs, path in zip(chosen_sets, output_paths) if len(chosen_qs) > 0]
+
+    def q_infos_from_ids(self, q_ids: list[str]) -> list[prepare.QRow]:
+        # NOTE: Questions come out in bank order (not in the order of 'q_ids') and excluded
+        #       questions are skipped.
+        inds: list[int] = []
+        for q_id in set(q_ids):
+            inds.extend(self.q_inds_by_id.get(q_id, []))
+
+        chosen_qs: list[prepare.QRow] = []
+        for ind in sorted(inds):
+            q = self.q_infos[ind]
+            if not q.excluded:
+                chosen_qs.append(q)
+
+        return chosen_qs
+
+    def answers_for(self, q_infos: list[QInfo] | list[prepare.QRow]) -> list[tuple[str, str]]:
+        # (question_id, answer) for every answer found for each of the questions, in order
+        ans_list: list[tuple[str, str]] = []
+        for q in q_infos:
+            for a_info in self.a_infos_by_id.get(q.q_id, []):
+                ans_list.append((a_info.q_id, a_info.answer))
+
+        return ans_list
+
+    def index_taxonomy(self) -> None:
+        # test -> domain -> skill -> difficulty -> positions in self.q_infos (in bank order)
+        bank: prepare.QuestionBank = self.q_infos
+        keys = np.stack([bank.codes[attr] for attr in ["test", "domain", "skill", "level"]], axis=1)
+        uniq_keys, key_inds = np.unique(keys, axis=0, return_inverse=True)
+        order = np.argsort(key_inds.ravel(), kind="stable")
+        bounds = np.searchsorted(key_inds.ravel()[order], np.arange(len(uniq_keys) + 1))
+
+        self.tax_index: dict[str, dict[str, dict[str, dict[str, np.ndarray]]]] = {}
+        for i, (t, d, sk, lv) in enumerate(uniq_keys.tolist()):
+            test = bank.categories["test"][t]
+            domain = bank.categories["domain"][d]
+            skill = bank.categories["skill"][sk]
+            level = bank.categories["level"][lv]
+            self.tax_index.setdefault(test, {}).setdefault(domain, {}).setdefault(skill, {})[
+                level
+            ] = order[bounds[i]:bounds[i + 1]]
+
+    def tax_positions(
+        self, test: str | None = None, domain: str | None = None, skill: str | None = None
+    ) -> np.ndarray:
+        # Positions (in bank order) of every question matching the given labels; None matches all
+        found: list[np.ndarray] = []
+        for t, domains in self.tax_index.items():
+            if test is not None and t != test:
+                continue
+            for d, skills in domains.items():
+                if domain is not None and d != domain:
+                    continue
+                for sk, levels in skills.items():
+                    if skill is not None and sk != skill:
+                        continue
+                    found.extend(levels.values())
+
+        if len(found) == 0:
+            return np.zeros(0, dtype=np.int64)
+
+        return np.sort(np.concatenate(found))
+
+    def sample_pool(
+        self,
+        pool: np.ndarray,
+        pool_wts: np.ndarray,
+        attr: str,
+        value: str,
+        n: int,
+        rng=None,
+    ) -> list[str]:
+        # NOTE: Same draw as 'DataFrame.sample(n=n, weights=..., replace=False)' on the matching
+        #       rows of the pool (same global numpy RNG and call), without building a DataFrame.
+        #       'rng' (a numpy RandomState) replaces the global RNG.
+        if rng is None:
+            rng = np.random
+        bank: prepare.QuestionBank = self.q_infos
+        categories: list[str] = bank.categories[attr]
+        if value not in categories:
+            matching = np.zeros(len(pool), dtype=np.bool_)
+        else:
+            matching = bank.codes[attr][pool] == categories.index(value)
+
+        candidates, wts = pool[matching], pool_wts[matching]
+        if n > len(candidates):
+            raise ValueError(
+                f"Cannot take a larger sample than population when 'replace=False': "
+                f"{n} > {len(candidates)} for {attr} '{value}'"
+            )
+
+        wt_sum = wts.sum()
+        if wt_sum == 0:
+            raise ValueError(f"Invalid weights: weights sum to zero for {attr} '{value}'")
+
+        sampled = rng.choice(len(candidates), size=n, replace=False, p=wts / wt_sum)
+        return [bank.ids[ind] for ind in candidates[sampled].tolist()]
+
+    def gather_possible_set(self, subject: str, input: dict) -> np.ndarray | None:
         # NOTE: Backward compability ("Reading and Writing" used to written as "RW")
         if subject == "RW":
             subject = "Reading and Writing"
 
         assert subject in ["Reading and Writing", "Math"]
 
-        # Columns of self.qdf
-        # ID, Pages, Difficulty, Excluded, Test, Domain, Skill, Source_PDF,
+        # Returns positions into self.q_infos (see self.tax_index)
 
         if subject not in input:
             return None
 
-        df = self.qdf
         subject_filter: int | dict = input[subject]
         if isinstance(subject_filter, int):
-            return df[df["Test"] == subject]
+            return self.tax_positions(test=subject)
 
         if not isinstance(subject_filter, dict):
             raise TypeError(
                 f"Unknown type for the subject filter: {type(subject_filter)}"
             )
 
-        new_qdf: pd.DataFrame = pd.DataFrame(columns=df.columns)
+        found: list[np.ndarray] = [np.zeros(0, dtype=np.int64)]
         for domain, dom_filter in subject_filter.items():
             if isinstance(dom_filter, int):
-                new_qdf = pd.concat([new_qdf, df[df["Domain"] == domain]])
+                found.append(self.tax_positions(domain=domain))
             elif isinstance(dom_filter, dict):
                 for skill, sk_filter in dom_filter.items():
                     if isinstance(sk_filter, int):
-                        new_qdf = pd.concat(
-                            [
-                                new_qdf,
-                                df[(df["Domain"] == domain) & (df["Skill"] == skill)],
-                            ]
-                        )
+                        found.append(self.tax_positions(domain=domain, skill=skill))
                     else:
                         raise TypeError(
                             f"Unknown type for the skill filter: {type(sk_filter)}"
@@ -332,30 +951,24 @@ class QGeneration:
                     f"Unknown type for the domain filter: {type(dom_filter)}"
                 )
 
-        return new_qdf
+        return np.concatenate(found)
 
     # ans_list: (question_id, answer)
     def export_answer_csv(
         self, ans_list: list[tuple[str, str]], answers_csv_path: str
     ) -> None:
-        data: dict = {"No.": [], "Question ID": [], "Answers": []}
-        for i, (q_id, answer) in enumerate(ans_list):
-            data["No."].append(i + 1)
-            data["Question ID"].append(f"'{q_id}'")
-            data["Answers"].append(answer)
-
-        pd.DataFrame(data).to_csv(answers_csv_path, index=False)
+        write_answer_csv(
+            answers_csv_path,
+            ((i + 1, f"'{q_id}'", answer) for i, (q_id, answer) in enumerate(ans_list)),
+        )
 
     def gen_answer_template(
-        self, all_chosen: list[QInfo], ans_template_path: str
+        self, all_chosen: list[prepare.QRow], ans_template_path: str
     ) -> None:
-        data: dict = {"No.": [], "Question ID": [], "Answers": []}
-        for i, chosen in enumerate(all_chosen):
-            data["No."].append(i + 1)
-            data["Question ID"].append(f"'{chosen.q_id}'")
-            data["Answers"].append("")
-
-        pd.DataFrame(data).to_csv(ans_template_path, index=False)
+        write_answer_csv(
+            ans_template_path,
+            ((i + 1, f"'{chosen.q_id}'", "") for i, chosen in enumerate(all_chosen)),
+        )
 
     def check_answers(
         self, student_ans_path: str, ans_key_path: str
@@ -391,71 +1004,118 @@ class QGeneration:
                 # Found an unanswered question
                 continue
 
-            math_mode = any([ltr.isdigit() for ltr in ans])
-            if not math_mode:
-                # NOTE: Since it doesn't contain digits, just compare the strings
-                correct += 1 if res == ans else 0
-                continue
-
-            if res == ans:
-                # NOTE: Even though it contains digits, just compare the strings to see if it
-                # matches. If it does not, proceed to math mode evaluation.
-                correct += 1
-                continue
+            correct += 1 if self.norm_answer(ans).accepts(res) else 0
 
-            re_pat = r"([\d]+\/[\d]+)|([\d.]+)"
-            # Regex match for response
-            rm = re.findall(re_pat, res, re.MULTILINE)[0]
-            # Regex match for answer
-            am = re.findall(re_pat, ans, re.MULTILINE)[0]
-
-            assert len(rm) == 2
-            assert len(am) == 2
-
-            # NOTE: Only one of these two (the fraction or decimal) should be matched
-            assert len(rm[0]) == 0 or len(rm[1]) == 0
-            assert len(am[0]) == 0 or len(am[1]) == 0
-
-            # First, convert any fraction into a decimal value
-            rmd, amd = 0.0, 0.0
-            if len(rm[0]) > 0:
-                nums = str(rm[0]).strip().split("/")
-                rmd = float(nums[0]) / float(nums[1])
-            else:
-                rmd = float(rm[1])
+        return (correct, total)
 
-            if len(am[0]) > 0:
-                nums = str(am[0]).strip().split("/")
-                amd = float(nums[0]) / float(nums[1])
-            else:
-                amd = float(am[1])
+    def grade_batch(
+        self, responses_dir: str, ans_key_path: str, out_prefix: str
+    ) -> tuple[pd.DataFrame, pd.DataFrame]:
+        # NOTE: Grades every response csv in 'responses_dir' against the same key and writes a
+        #       per student (<out_prefix>-students.csv) and a per question
+        #       (<out_prefix>-questions.csv) results table
+        from pathlib import Path
+
+        key: prepare.AnswerKey = prepare.AnswerKey.from_csv(ans_key_path, self.norm_answer)
+        response_paths: list[str] = sorted(
+            str(p) for p in Path(responses_dir).glob("*.csv")
+            if p.resolve() != Path(ans_key_path).resolve()
+        )
 
-            correct += 1 if abs(rmd - amd) < 1e-3 else 0
+        prepare.timer.start()
+        responses: np.ndarray = key.response_matrix(response_paths)
+        correct: np.ndarray = key.grade(responses)
+        prepare.timer.stop(f"Graded {len(response_paths)} response csvs")
+
+        student_df = pd.DataFrame({
+            "Student": [Path(p).stem for p in response_paths],
+            "Correct": correct.sum(axis=1),
+            "Answered": (responses != "").sum(axis=1),
+            "Total": len(key.q_ids),
+        })
+        student_df["Score"] = (student_df["Correct"] / max(len(key.q_ids), 1)).round(4)
+
+        question_df = pd.DataFrame({
+            "No.": np.arange(1, len(key.q_ids) + 1),
+            "Question ID": key.q_ids,
+            "Answers": key.answers,
+            "Correct": correct.sum(axis=0),
+            "Answered": (responses != "").sum(axis=0),
+        })
+        question_df["Correct Rate"] = (question_df["Correct"] / max(len(response_paths), 1)).round(4)
+
+        student_df.to_csv(out_prefix + "-students.csv", index=False)
+        question_df.to_csv(out_prefix + "-questions.csv", index=False)
+
+        return student_df, question_df
+
+    def open_src_pdf(self, path: str) -> Document:
+        # NOTE: Source pdfs stay open across calls, so a long running process (i.e. 'serve') only
+        #       opens each of them once; at most self.max_open_src_pdfs are kept open.
+        doc: Document | None = self.src_docs.get(path)
+        if doc is not None:
+            self.src_docs.move_to_end(path)
+            return doc
+
+        doc = fitz.open(path)
+        self.src_docs[path] = doc
+        while len(self.src_docs) > self.max_open_src_pdfs:
+            _, lru_doc = self.src_docs.popitem(last=False)
+            lru_doc.close()
+
+        if path not in self.src_page_empty or len(self.src_page_empty[path]) != len(doc):
+            self.src_page_empty[path] = np.full(len(doc), -1, dtype=np.int8)
+
+        return doc
+
+    def is_src_page_empty(self, path: str, pg_no: int) -> bool:
+        empty: np.ndarray = self.src_page_empty[path]
+        if empty[pg_no] < 0:
+            empty[pg_no] = prepare.is_page_empty(self.open_src_pdf(path).load_page(pg_no))
+
+        return bool(empty[pg_no])
+
+    def fragment_path(self, src_pdf: str, q_id: str, pg_inds: list[int]) -> str | None:
+        source: dict | None = self.fragment_sources.get(src_pdf)
+        if source is None or source["questions"].get(q_id) != pg_inds:
+            return None
 
-        return (correct, total)
+        path: str = os.path.join(self.fragment_dir, source["dir"], f"{q_id}.pdf")
+        return path if os.path.exists(path) else None
 
-    def gen_pdf_from_q_infos(self, q_infos: list[QInfo]) -> Document:
-        out_pdf: Document = Document()
+    def gen_pdf_from_q_infos(self, q_infos: list[QInfo] | list[prepare.QRow]) -> Document:
+        out_pdf: Document = fitz.Document()
 
         print(f"Saving {len(q_infos)} questions...")
 
-        path_to_docs: dict[str, Document] = {}
+        # (pdf, first page, last page) of every run of consecutive non-empty pages; whole
+        # fragments have a last page of -1
+        runs: list[list] = []
         for ssqb in q_infos:
-            if ssqb.src_pdf not in path_to_docs.keys():
-                path_to_docs[ssqb.src_pdf] = fitz.open(ssqb.src_pdf)
+            src_pdf: str = ssqb.src_pdf
+            pg_inds: list[int] = ssqb.pg_inds
+
+            fragment_path: str | None = self.fragment_path(src_pdf, ssqb.q_id, pg_inds)
+            if fragment_path is not None:
+                runs.append([fragment_path, 0, -1])
+                continue
 
-            doc: Document = path_to_docs[ssqb.src_pdf]
-            page_nos: list[int] = ssqb.pg_inds
-            if len(page_nos) == 1:
-                page_nos.append(page_nos[0])
+            self.open_src_pdf(src_pdf)
+            for pg_no in prepare.question_page_range(pg_inds, src_pdf):
+                if self.is_src_page_empty(src_pdf, pg_no):
+                    continue
 
-            assert len(page_nos) <= 3, (
-                f"A page range should have a max of 3 numbers -> pages: {page_nos}; src = '{ssqb.src_pdf}'"
-            )
+                if len(runs) > 0 and runs[-1][0] == src_pdf and runs[-1][2] + 1 == pg_no:
+                    runs[-1][2] = pg_no
+                else:
+                    runs.append([src_pdf, pg_no, pg_no])
 
-            for pg_no in range(page_nos[0], page_nos[1] + 1):
-                if not prepare.is_page_empty(doc.load_page(pg_no)):
-                    out_pdf.insert_pdf(doc, from_page=pg_no, to_page=pg_no)
+        for path, from_page, to_page in runs:
+            if to_page < 0:
+                with fitz.open(path) as fragment:
+                    out_pdf.insert_pdf(fragment)
+            else:
+                out_pdf.insert_pdf(self.open_src_pdf(path), from_page=from_page, to_page=to_page)
 
         return out_pdf
 
@@ -464,36 +1124,346 @@ class QGeneration:
     ) -> None:
         q_infos: list[QInfo] = prepare.parse_question_pdf(in_pdf_path, False)
 
-        ans_list: list[tuple[str, str]] = []
-        for chosen in q_infos:
-            for a_info in self.a_infos:
-                if a_info.q_id == chosen.q_id:
-                    ans_list.append((a_info.q_id, a_info.answer))
+        ans_list: list[tuple[str, str]] = self.answers_for(q_infos)
 
-        doc = fitz.open(in_pdf_path) if append_ans else Document()
-        qg.put_answers_on_page(doc, ans_list)
+        doc = fitz.open(in_pdf_path) if append_ans else fitz.Document()
+        self.put_answers_on_page(doc, ans_list)
         doc.save(out_pdf_path)
 
+    def all_qids(self) -> list[str]:
+        return list(self.q_infos.ids)
+
+    def write_artifacts(self, artifacts_dir: str | None = None) -> dict[str, dict]:
+        import hashlib
+        import tempfile
+
+        if artifacts_dir is None:
+            artifacts_dir = artifacts_dir_for(self.q_parsed_path)
+
+        payloads: dict[str, dict] = {
+            "qids": {"qIds": self.all_qids()},
+            "skill-tree": self.build_skill_tree(),
+            "skill-tree-difficulty": self.build_skill_tree(w_difficulty=True),
+        }
+
+        # NOTE: Other processes may be (re)writing the same artifacts at the same time (e.g. the
+        #       express fallback asking for ids and skill tree at once), so everything is written
+        #       to a temp file of its own first and then renamed into place.
+        def write_atomic(path: str, data: bytes) -> None:
+            fd, tmp_path = tempfile.mkstemp(dir=artifacts_dir, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+
+        os.makedirs(artifacts_dir, exist_ok=True)
+        artifacts: dict[str, dict] = {}
+        for name, payload in payloads.items():
+            # NOTE: Exactly the bytes the 'allids'/'skilltree' modes have always written
+            data: bytes = json.dumps(payload, indent=4).encode()
+            etag: str = hashlib.sha256(data).hexdigest()[:16]
+            file_name: str = f"{name}-{etag}.json"
+
+            artifact_path: str = os.path.join(artifacts_dir, file_name)
+            if not os.path.exists(artifact_path):
+                write_atomic(artifact_path, data)
+
+            artifacts[name] = {"file": file_name, "etag": etag}
+
+        index: dict = {
+            "version": ARTIFACTS_VERSION,
+            "q_parsed_path": os.path.normpath(self.q_parsed_path),
+            "artifacts": artifacts,
+        }
+        write_atomic(artifacts_index_path(artifacts_dir), json.dumps(index, indent=4).encode())
+
+        # Artifacts of older banks are not referenced by anything anymore
+        current: set[str] = {artifact["file"] for artifact in artifacts.values()}
+        for file_name in os.listdir(artifacts_dir):
+            if file_name.endswith(".json") and file_name != ARTIFACTS_INDEX_NAME and file_name not in current:
+                try:
+                    os.remove(os.path.join(artifacts_dir, file_name))
+                except FileNotFoundError:
+                    pass
+
+        return artifacts
+
+    def read_artifact(self, name: str) -> tuple[bytes, str]:
+        return read_artifact(name, self.q_parsed_path, qg=self)
+
     def export_all_qids(self, out_path: str = "qids.json") -> None:
-        all_ids: list[str] = [ssqb.q_id for ssqb in self.q_infos]
+        all_ids: list[str] = self.all_qids()
         with open(out_path, "w") as f:
             json.dump({"qIds": all_ids}, f, indent=4)
 
         print(f"Complete! Exported ids to '{out_path}'")
 
 
+# Per worker process QGeneration used by _save_question_set_pdf and _question_set_pdf_bytes
+_pdf_worker: QGeneration | None = None
+
+
+def _init_pdf_worker(
+    fragment_dir: str = FRAGMENT_STORE_DIR, src_pdfs: list[str] | None = None
+) -> None:
+    # Opens 'src_pdfs' up front so that not even the worker's first set has to
+    global _pdf_worker
+    _pdf_worker = QGeneration.pdf_only(fragment_dir)
+    for src_pdf in src_pdfs or []:
+        if os.path.exists(src_pdf):
+            _pdf_worker.open_src_pdf(src_pdf)
+
+
+def _save_question_set_pdf(
+    job: tuple[list[QInfo], str, str, list[tuple[str, str]] | None]
+) -> tuple[int, float]:
+    if _pdf_worker is None:
+        _init_pdf_worker()
+
+    q_infos, output_path, save_profile, page_answers = job
+    return save_pdf(_pdf_worker.question_set_doc(q_infos, page_answers), output_path, save_profile)
+
+
+def _question_set_pdf_bytes(
+    job: tuple[list[QInfo], str, list[tuple[str, str]] | None]
+) -> bytes:
+    if _pdf_worker is None:
+        _init_pdf_worker()
+
+    q_infos, save_profile, page_answers = job
+    return pdf_to_bytes(_pdf_worker.question_set_doc(q_infos, page_answers), save_profile)
+
+
+def discard_answer_files(written: Future, keep: set[str] | None = None) -> None:
+    # NOTE: A set whose pdf could not be saved should not leave its answer csvs behind. 'written'
+    #       is the writer's future (of write_answer_files or a dict of output path -> its csvs);
+    #       the csvs of the output paths in 'keep' stay.
+    try:
+        result: list[str] | dict[str, list[str]] = written.result()
+    except Exception:
+        return
+
+    by_output: dict[str, list[str]] = result if isinstance(result, dict) else {"": result}
+    for output_path, csv_paths in by_output.items():
+        if keep is not None and output_path in keep:
+            continue
+        for csv_path in csv_paths:
+            try:
+                os.remove(csv_path)
+            except FileNotFoundError:
+                pass
+
+
+def write_answer_csv(csv_path: str, rows) -> None:
+    # NOTE: Writes the same bytes DataFrame.to_csv(index=False) did, without building a DataFrame
+    import csv
+
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.writer(f, lineterminator="\n")
+        writer.writerow(ANSWER_CSV_HEADER)
+        writer.writerows(rows)
+
+
+def save_profile_options(profile: str) -> dict:
+    if profile not in SAVE_PROFILES:
+        raise ValueError(
+            f"Unknown save profile: '{profile}' (expected one of {list(SAVE_PROFILES)})"
+        )
+
+    return SAVE_PROFILES[profile]
+
+
+def save_pdf(doc: Document, output_path: str, profile: str = DEFAULT_SAVE_PROFILE) -> tuple[int, float]:
+    # Returns the size of the saved pdf (in bytes) and how long saving it took (in seconds)
+    options: dict = save_profile_options(profile)
+
+    start = time.perf_counter()
+    doc.save(output_path, **options)
+    elapsed = time.perf_counter() - start
+
+    size: int = os.path.getsize(output_path)
+    print(f"Saved '{output_path}' [{profile}]: {size / 1024:.1f} KiB in {elapsed * 1000:.1f} ms")
+
+    return size, elapsed
+
+
+# Document.save() keyword -> the mupdf write option it sets
+MUPDF_WRITE_OPTIONS: dict[str, str] = {
+    "garbage": "do_garbage",
+    "deflate": "do_compress",
+    "deflate_images": "do_compress_images",
+    "deflate_fonts": "do_compress_fonts",
+    "use_objstms": "do_use_objstms",
+}
+
+
+def pdf_to_bytes(doc: Document, profile: str = DEFAULT_SAVE_PROFILE) -> bytes:
+    # The pdf as save_pdf would have written it, without touching the disk
+    options: dict = save_profile_options(profile)
+
+    # NOTE: doc.tobytes() hands mupdf a python file object that it then writes to in lots of tiny
+    #       pieces, which makes it ~8x slower than saving to a file (~170 ms vs ~20 ms for a 120
+    #       question set). Writing into one of mupdf's own buffers is as fast as a save. The
+    #       options are set up the same way Document.save() does it, so the bytes are the same
+    #       (apart from the random /ID).
+    start = time.perf_counter()
+    write_opts = fitz.mupdf.PdfWriteOptions()
+    write_opts.do_encrypt = 1  # PDF_ENCRYPT_NONE
+    write_opts.permissions = 4095
+    write_opts.do_preserve_metadata = 1
+    for name, value in options.items():
+        setattr(write_opts, MUPDF_WRITE_OPTIONS[name], value)
+
+    pdf = fitz.mupdf.pdf_document_from_fz_document(doc.this)
+    fitz.JM_ensure_identity(pdf)
+    buffer = fitz.mupdf.FzBuffer(1 << 20)
+    out = fitz.mupdf.FzOutput(buffer)
+    fitz.mupdf.pdf_write_document(pdf, out, write_opts)
+    out.fz_close_output()
+    data: bytes = buffer.fz_buffer_extract()
+    elapsed = time.perf_counter() - start
+
+    print(f"Serialised pdf [{profile}]: {len(data) / 1024:.1f} KiB in {elapsed * 1000:.1f} ms")
+
+    return data
+
+
+def load_qset_inputs(input_path: str) -> list[dict]:
+    # Either a .jsonl file (one filter spec per line), a json array of specs or a single spec
+    with open(input_path, "r") as f:
+        if input_path.endswith(".jsonl"):
+            return [json.loads(line) for line in f if line.strip()]
+
+        inputs = json.load(f)
+
+    return inputs if isinstance(inputs, list) else [inputs]
+
+
+def canonical_qset_spec(input: dict) -> dict:
+    # What decides the contents of a set, written the same way for specs that only differ in
+    # how they are written down (key order, 1 vs 1.0, order/duplicates of ids, where it goes...)
+    spec: dict = {
+        key: value for key, value in input.items() if key not in ["cohort", "folder", "filename"]
+    }
+    spec["prob"] = {level: float(prob) for level, prob in input["prob"].items() if prob != 0}
+    if "chosenIds" in spec:
+        spec["chosenIds"] = sorted(set(spec["chosenIds"]))
+    spec.setdefault("saveProfile", DEFAULT_SAVE_PROFILE)
+
+    return spec
+
+
+def evict_qset_cache(cache_dir: str = QSET_CACHE_DIR, max_bytes: int = QSET_CACHE_MAX_BYTES) -> None:
+    import shutil
+
+    # (last used, size, path) of every complete entry
+    entries: list[tuple[float, int, str]] = []
+    for entry in os.scandir(cache_dir):
+        if not entry.is_dir() or ".tmp-" in entry.name:
+            continue
+        # NOTE: Another thread or process may be evicting the same entries right now
+        try:
+            size: int = sum(f.stat().st_size for f in os.scandir(entry.path))
+            entries.append((entry.stat().st_mtime, size, entry.path))
+        except FileNotFoundError:
+            continue
+
+    total: int = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+
+
+def artifacts_dir_for(q_parsed_path: str) -> str:
+    # e.g. './artifacts/all-q-parsed' for './all-q-parsed.csv'
+    return os.path.join(ARTIFACTS_DIR, os.path.splitext(os.path.basename(q_parsed_path))[0])
+
+
+def artifacts_index_path(artifacts_dir: str) -> str:
+    return os.path.join(artifacts_dir, ARTIFACTS_INDEX_NAME)
+
+
+def load_artifacts_index(q_parsed_path: str) -> dict[str, dict] | None:
+    # name -> {"file": ..., "etag": ...}; None if they are missing or older than the parsed csv
+    index_path: str = artifacts_index_path(artifacts_dir_for(q_parsed_path))
+    try:
+        if os.path.getmtime(index_path) < os.path.getmtime(q_parsed_path):
+            return None
+
+        with open(index_path, "r") as f:
+            index: dict = json.load(f)
+    except FileNotFoundError:
+        return None
+
+    # NOTE: A csv of the same name somewhere else shares the directory
+    if (index.get("version") != ARTIFACTS_VERSION
+        or index.get("q_parsed_path") != os.path.normpath(q_parsed_path)):
+        return None
+
+    return index["artifacts"]
+
+
+def read_artifact(
+    name: str,
+    q_parsed_path: str = "./all-q-parsed.csv",
+    qg: QGeneration | None = None,
+) -> tuple[bytes, str]:
+    # (content, etag) of one of the artifacts; (re)builds them first if needed
+    artifacts_dir: str = artifacts_dir_for(q_parsed_path)
+    artifacts: dict[str, dict] | None = load_artifacts_index(q_parsed_path)
+    if artifacts is None:
+        if qg is None:
+            qg = QGeneration(q_parsed_path, load_answers=False)
+        artifacts = qg.write_artifacts(artifacts_dir)
+
+    artifact: dict = artifacts[name]
+    try:
+        with open(os.path.join(artifacts_dir, artifact["file"]), "rb") as f:
+            return f.read(), artifact["etag"]
+    except FileNotFoundError:
+        # Another process rebuilt them in between (for a newer csv) and dropped the old ones
+        if qg is None:
+            qg = QGeneration(q_parsed_path, load_answers=False)
+        artifact = qg.write_artifacts(artifacts_dir)[name]
+        with open(os.path.join(artifacts_dir, artifact["file"]), "rb") as f:
+            return f.read(), artifact["etag"]
+
+
 def usage(program: str) -> None:
     print(f"USAGE: {program} <MODES> [ARGS]\n")
     print("Modes:")
+    print(
+        "        parse [--jobs N]              |  Parse all question and answer pdfs (N worker processes)"
+    )
+    print(
+        "              [--page-jobs M]         |  Split each pdf into M page shards parsed in parallel"
+    )
+    print(
+        "              [--full]                |  Reparse every pdf, even the unchanged ones"
+    )
+    print(
+        "              [--fragments]           |  Also cut every question into its own pdf for faster qsets"
+    )
     print(
         "         qset < IN_JSON  >            |  Generate question set given an input json for filtering"
     )
+    print(
+        "   qset-batch < IN_JSON  > [--jobs N] |  Generate a question set for every filter in a json array/jsonl"
+    )
     print(
         "       allids < OUT_JSON >            |  Get a json containing the id of all questions"
     )
     print(
         "     parse-qs < OUT_CSV  >            |  Categorize questions pdfs and output a single csv"
     )
+    print(
+        "   export-csv < OUT_CSV  >            |  Export the loaded question bank as a csv"
+    )
     print(
         "     parse-as < OUT_CSV  >            |  Categorize answers pdfs and output a single csv"
     )
@@ -504,6 +1474,18 @@ def usage(program: str) -> None:
         "    regen-ans <  IN_PDF  > <OUT_PDF>  |  Regenerate answers from a question pdf"
     )
     print("        grade <  IN_CSV  > <ANS_CSV>  |  Grade responses against answer csv")
+    print(
+        "  grade-batch <  IN_DIR  > <ANS_CSV>  |  Grade every response csv in a directory against answer csv"
+    )
+    print(
+        "              [OUT_PREFIX]            |  Results go to <OUT_PREFIX>-students/-questions.csv (default: <IN_DIR>-results)"
+    )
+    print(
+        "        serve [  PORT   ] [--jobs N]  |  Keep the bank loaded and answer requests over http"
+    )
+    print(
+        "                                      |  (pdfs assembled by N processes; default: one per cpu)"
+    )
     print("         help                         |  Get this help message")
 
 
@@ -515,11 +1497,47 @@ if __name__ == "__main__":
 
     mode: str = sys.argv[1]
     args: list[str] = sys.argv[2:]
-    qg = QGeneration()
+
+    # NOTE: Only the parts of the bank a mode actually uses get loaded: (questions, answers)
+    bank_parts: dict[str, tuple[bool, bool]] = {
+        "parse": (False, False),
+        "qset": (True, True),
+        "qset-batch": (True, True),
+        "export-csv": (True, False),
+        "regen-ans": (False, True),
+        "grade": (False, True),
+        "grade-batch": (False, True),
+        "serve": (True, True),
+    }
+    if mode in bank_parts:
+        load_questions, load_answers = bank_parts[mode]
+        qg = QGeneration(load_questions=load_questions, load_answers=load_answers)
 
     match mode:
         case "parse":
-            qg.parse_pdfs()
+            force: bool = "--full" in args
+            fragments: bool = "--fragments" in args
+            args = [arg for arg in args if arg not in ["--full", "--fragments"]]
+
+            parse_opts: dict[str, int] = {"--jobs": 1, "--page-jobs": 1}
+            if len(args) % 2 != 0 or any(
+                opt not in parse_opts for opt in args[::2]
+            ):
+                print(
+                    "ERROR: supported options for parse are '--jobs N', '--page-jobs M', '--full' and '--fragments'."
+                )
+                print("Try rerunning this command with the 'help' flag for more info.")
+                sys.exit(1)
+
+            for opt, val in zip(args[::2], args[1::2]):
+                parse_opts[opt] = int(val)
+
+            qg.parse_pdfs(
+                jobs=parse_opts["--jobs"],
+                page_jobs=parse_opts["--page-jobs"],
+                force=force,
+                fragments=fragments,
+            )
 
         case "qset":
             if len(args) != 1:
@@ -535,12 +1553,33 @@ if __name__ == "__main__":
             qg.create_question_set_v2(input_json)
             print(f"Complete! Exported PDF from filters at '{input_path}'")
 
+        case "qset-batch":
+            if len(args) not in [1, 3] or (len(args) == 3 and args[1] != "--jobs"):
+                print("ERROR: provide a json array or jsonl of filters (and optionally '--jobs N').")
+                print("Try rerunning this command with the 'help' flag for more info.")
+                sys.exit(1)
+
+            jobs: int = int(args[2]) if len(args) == 3 else 1
+            qg.create_question_sets(load_qset_inputs(args[0]), jobs)
+
+        case "export-csv":
+            if len(args) != 1:
+                print("ERROR: provide the output csv path.")
+                print("Try rerunning this command with the 'help' flag for more info.")
+                sys.exit(1)
+
+            qg.q_infos.to_df().to_csv(args[0], index=False)
+            print(f"Complete! Exported question bank to '{args[0]}'")
+
         case "allids":
-            qg.export_all_qids()
+            with open("qids.json", "wb") as f:
+                f.write(read_artifact("qids")[0])
+            print("Complete! Exported ids to 'qids.json'")
 
         case "skilltree":
             out_json: str = args[0] if len(args) > 0 else "skill-tree.json"
-            qg.gen_skill_tree(out_json)
+            with open(out_json, "wb") as f:
+                f.write(read_artifact("skill-tree")[0])
             print(f"Complete! Exported skill tree to '{out_json}'")
 
         case "regen-ans":
@@ -561,6 +1600,31 @@ if __name__ == "__main__":
             correct, total = qg.check_answers("sample-response2.csv", "sample-key.csv")
             print(correct, "out of", total)
 
+        case "grade-batch":
+            if len(args) not in [2, 3]:
+                print("ERROR: provide the responses directory and the answer csv.")
+                print("Try rerunning this command with the 'help' flag for more info.")
+                sys.exit(1)
+
+            out_prefix: str = args[2] if len(args) == 3 else args[0].rstrip("/") + "-results"
+            student_df, _ = qg.grade_batch(args[0], args[1], out_prefix)
+            print(
+                f"Complete! Graded {len(student_df)} students; results at '{out_prefix}-students.csv'"
+                f" and '{out_prefix}-questions.csv'"
+            )
+
+        case "serve":
+            import service
+
+            jobs: int = os.cpu_count() or 1
+            if "--jobs" in args:
+                jobs_ind: int = args.index("--jobs")
+                jobs = int(args[jobs_ind + 1])
+                args = args[:jobs_ind] + args[jobs_ind + 2:]
+
+            port: int = int(args[0]) if len(args) > 0 else 8081
+            service.serve(qg, port=port, jobs=jobs)
+
         case "help":
             usage(program)
 
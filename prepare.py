@@ -1,8 +1,11 @@
-from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
 import datetime as dt
-import io, json, re, time
+from functools import partial
+import csv, hashlib, io, json, os, re, shutil, sys, tempfile, time, zipfile
 from typing import Literal
 
+import numpy as np
 import pandas as pd
 import fitz
 from pymupdf import Document, Page
@@ -53,6 +56,14 @@ class Timer:
 
 timer: Timer = Timer()
 PAGE_DELIMITER: str = "_"
+# NOTE: Bump this whenever the parsing logic changes so that cached parses get redone
+PARSER_VERSION: int = 2
+# NOTE: What an annoying bug. Can CollegeBoard really not make sure that they use a consistent
+#       naming mechanism? I guess it's not suprising... Fixed up once here, at parse time, so that
+#       nothing downstream has to know about it.
+SKILL_NAME_FIXES: dict[str, str] = {
+    "Cross-text Connections": "Cross-Text Connections",
+}
 
 def pages_as_str(page_inds: list[int]) -> str:
     if len(page_inds) == 0:
@@ -79,7 +90,7 @@ class QInfo:
     def __eq__(self, other) -> bool:
         # NOTE: Equality will be detected based on the ids; therefore this function
         #       assumes that each question has a UNIQUE id
-        return isinstance(other, QInfo) and self.q_id == other.q_id
+        return isinstance(other, (QInfo, QRow)) and self.q_id == other.q_id
 
     def __hash__(self) -> int:
         return hash((self.q_id, self.domain, self.skill, self.pg_inds[0]))
@@ -92,63 +103,127 @@ class AnsInfo:
     pg_inds: list[int]
 
 
+# NOTE: Every question page has its difficulty in the top right corner, either as three bars
+#       (drawings, ~(466, 91)-(597, 97)) or as a single 46px wide image (~(482, 103)-(516, 114)).
+DIFFICULTY_HEADER_RECT: tuple[float, float, float, float] = (440.0, 80.0, 612.0, 125.0)
+DIFFICULTY_IMG_WIDTH: int = 46
+
+class PageExtract:
+    # NOTE: Everything the parser needs from a page, extracted at most once. The text is always
+    #       needed; the images and filled drawings are only pulled out of the page on first use
+    #       (i.e. for empty-looking pages and for the difficulty of question id pages).
+    def __init__(self, page: Page) -> None:
+        self.page: Page = page
+
+        text = page.get_text()
+        assert isinstance(text, str)
+        self.text: str = text
+
+        self._images: list | None = None
+        self._header_fills: list[tuple[float, ...]] | None = None
+
+    @property
+    def images(self) -> list:
+        if self._images is None:
+            self._images = self.page.get_images(full=True)
+        return self._images
+
+    @property
+    def header_fills(self) -> list[tuple[float, ...]]:
+        # Fill colors of the drawings inside DIFFICULTY_HEADER_RECT
+        if self._header_fills is None:
+            # NOTE: get_cdrawings() skips building Rect/Point objects for every path item,
+            #       which is all get_drawings() adds on top; only the fill colors are used.
+            x0, y0, x1, y1 = DIFFICULTY_HEADER_RECT
+            self._header_fills = []
+            for d in self.page.get_cdrawings():
+                fill = d.get("fill")
+                if fill is None:
+                    continue
+
+                rx0, ry0, rx1, ry1 = d["rect"]
+                if rx0 >= x0 and ry0 >= y0 and rx1 <= x1 and ry1 <= y1:
+                    self._header_fills.append(fill)
+        return self._header_fills
+
+    def is_empty(self) -> bool:
+        return not (self.text.strip() or self.images)
+
 def is_page_empty(page: Page) -> bool:
     page_text = page.get_text()
     assert isinstance(page_text, str)
 
-    has_text = bool(page_text.strip())
+    if page_text.strip():
+        return False
+
     has_images = bool(page.get_images())
     # has_drawings = bool(page.get_drawings())
 
-    return not (bool(has_text) or bool(has_images))
+    return not has_images
+
+def count_difficulty_pixels(doc: Document, xref: int) -> int:
+    # Look for this color
+    diff_i_color: tuple[int, int, int] = (0, 83, 155)
+
+    base_image = doc.extract_image(xref)
+    img_bytes = base_image["image"]
+    pil_img = Image.open(io.BytesIO(img_bytes))
+    assert pil_img.width == DIFFICULTY_IMG_WIDTH
 
-def get_difficulty(doc: Document, page: Page, drawing_only: bool) -> Level | None:
+    # To determine the difficulty, I am going to sample 3 specific pixels
+    # and depending on its color, I will determine the page's labeled difficulty
+    count: int = 0
+    y = int(pil_img.height / 2)
+    for x in [5, pil_img.width / 2, pil_img.width - 5]:
+
+        color = pil_img.getpixel((int(x), y))
+        assert isinstance(color, tuple)
+        if color == diff_i_color:
+            count += 1
+
+    return count
+
+def get_difficulty(
+    doc: Document,
+    extract: PageExtract,
+    drawing_only: bool,
+    xref_counts: dict[int, int] | None = None,
+) -> Level | None:
     count: int = 0
 
     if drawing_only:
         # Look for this color
         diff_d_color: tuple[float, float, float] = (0.0, 0.37254899740219116, 0.6274510025978088)
-        drawings = page.get_drawings()
         def close(a: float, b: float) -> bool:
             return abs(a - b) < 5e-5
 
-        for d in drawings:
-            color = d["fill"]
-            if color is None:
-                continue
-
+        for color in extract.header_fills:
             if (close(color[0], diff_d_color[0])
                 and close(color[1], diff_d_color[1])
                 and close(color[2], diff_d_color[2])):
                 count += 1
     else:
-        # Look for this color
-        diff_i_color: tuple[int, int, int] = (0, 83, 155)
-        image_list = page.get_images(full=True)
+        image_list = extract.images
         if len(image_list) == 0:
             print("No images found.")
             return None
 
+        # NOTE: The same difficulty image is usually embedded once and shown on every page, so
+        #       'xref_counts' (per document) makes sure each one is only ever decoded once.
+        if xref_counts is None:
+            xref_counts = {}
+
         found_usable: bool = False
-        for image_index, img in enumerate(image_list):
-            xref = img[0]
-            base_image = doc.extract_image(xref)
-            img_bytes = base_image["image"]
-            pil_img = Image.open(io.BytesIO(img_bytes))
-            if pil_img.width != 46:
+        for img in image_list:
+            xref, width = img[0], img[2]
+            if width != DIFFICULTY_IMG_WIDTH:
                 continue
 
             found_usable = True
 
-            # To determine the difficulty, I am going to sample 3 specific pixels
-            # and depending on its color, I will determine the page's labeled difficulty
-            y = int(pil_img.height / 2)
-            for x in [5, pil_img.width / 2, pil_img.width - 5]:
-
-                color = pil_img.getpixel((int(x), y))
-                assert isinstance(color, tuple)
-                if color == diff_i_color:
-                    count += 1
+            if xref not in xref_counts:
+                xref_counts[xref] = count_difficulty_pixels(doc, xref)
+            count += xref_counts[xref]
 
         if not found_usable:
             print(f"I could not find any good image to interpret the difficulty.")
@@ -159,23 +234,178 @@ def get_difficulty(doc: Document, page: Page, drawing_only: bool) -> Level | Non
         case 3: return "hard"
         case _: return None
 
-def parse_question_pdf(path: str, excluded: bool) -> list[QInfo]:
+Q_ID_RE: re.Pattern = re.compile(r"Question ID ([0-9a-f]{8})")
+LABEL_INFO_RE: re.Pattern = re.compile(
+    r"Assessment (\w*) Test ([\w\s]*) Domain ([\w\s-]*) Skill ([\w\s,:-]*) D"
+)
+ANSWER_RES: list[re.Pattern] = [
+    # NOTE: I have the following patterns in case the first one does not match
+    # 0: Should be common for MCQs and FRQs
+    re.compile(r"Correct Answer:[\s]([A-Za-z0-9.\/-]+)"),
+    # 1: Common for MCQs only
+    re.compile(r"Choice ([ABCDE]{1}) is correct\."),
+    # 2: Common for FRQs only
+    re.compile(r"The correct answer is ([A-Za-z0-9.\/-]+)\."),
+    # 3: For a specific question in adv math where a question asks for possible solutions
+    re.compile(r"The correct answer is either ([A-Za-z0-9.\/, -]+)\."),
+]
+
+@dataclass
+class PageFields:
+    q_id: str | None = None
+    assessment: str | None = None
+    test: str | None = None
+    domain: str | None = None
+    skill: str | None = None
+    answer: str | None = None
+
+def search_once(pattern: re.Pattern, text: str, pos: int = 0) -> re.Match | None | Literal[False]:
+    # NOTE: Same as checking 'len(re.findall(...)) == 1', but stops scanning as soon as a second
+    #       match shows up. Returns None if there is no match and False if there are several.
+    match = pattern.search(text, pos)
+    if match is None:
+        return None
+
+    if pattern.search(text, match.end()) is not None:
+        return False
+
+    return match
+
+def extract_question_fields(text: str) -> PageFields:
+    fields = PageFields()
+
+    match = search_once(Q_ID_RE, text)
+    if match:
+        fields.q_id = match.group(1)
+
+    labels_start_ind: int = text.find("Assessment")
+    if labels_start_ind >= 0:
+        label_infos = ' '.join(text[labels_start_ind:].split())
+        match = search_once(LABEL_INFO_RE, label_infos)
+        if match:
+            fields.assessment, fields.test, fields.domain, fields.skill = match.groups()
+
+    return fields
+
+def extract_answer_fields(text: str) -> PageFields:
+    fields = PageFields()
+
+    match = search_once(Q_ID_RE, text)
+    if match:
+        fields.q_id = match.group(1)
+
+    # NOTE: The answer (and its rationale) always comes after "Correct Answer"; the question
+    #       itself can be skipped.
+    answer_start_ind: int = max(text.find("Correct Answer"), 0)
+    for pattern in ANSWER_RES:
+        match = search_once(pattern, text, answer_start_ind)
+        if match is None:
+            continue
+
+        if match:
+            fields.answer = match.group(1)
+        break
+
+    return fields
+
+@dataclass
+class QPageInfo:
+    page_ind: int
+    # Only set if the page contains exactly one question id
+    q_id: str | None
+    level: Level | None
+    # (assessment, test, domain, skill)
+    labels: tuple[str, str, str, str] | None
+
+@dataclass
+class APageInfo:
+    page_ind: int
+    # Only set if the page contains exactly one question id
+    q_id: str | None
+    answer: str | None
+
+def scan_question_pages(path: str, start: int, end: int) -> list[QPageInfo]:
     doc: Document = fitz.open(path)
-    q_infos: list[QInfo] = []
-    curr: QInfo = QInfo("", "", "", "easy", "", "", [], False)
+    page_infos: list[QPageInfo] = []
+    xref_counts: dict[int, int] = {}
 
-    for page_ind in range(len(doc)):
-        page = doc.load_page(page_ind)
-        if is_page_empty(page):
+    for page_ind in range(start, end):
+        extract = PageExtract(doc.load_page(page_ind))
+        if extract.is_empty():
             # Skip pages that are empty
             continue
 
-        text = page.get_text()
-        assert isinstance(text, str)
+        fields: PageFields = extract_question_fields(extract.text)
+        info = QPageInfo(page_ind=page_ind, q_id=fields.q_id, level=None, labels=None)
+
+        if info.q_id is not None:
+            difficulty: Level | None = get_difficulty(doc, extract, drawing_only=True)
+            if difficulty is None:
+                # This is a backup way of finding the difficulty; it should be able to find
+                # out the difficulty purely through its drawings, but you never know . . .
+                difficulty: Level | None = get_difficulty(
+                    doc, extract, drawing_only=False, xref_counts=xref_counts
+                )
+                assert difficulty is not None, f"[{path}, pg: {page_ind + 1}] Unable to find difficulty"
+
+            info.level = difficulty
+
+        if fields.assessment is not None:
+            info.labels = (fields.assessment, fields.test, fields.domain, fields.skill)
+
+        page_infos.append(info)
+
+    return page_infos
+
+def scan_answer_pages(path: str, start: int, end: int) -> list[APageInfo]:
+    doc: Document = fitz.open(path)
+    page_infos: list[APageInfo] = []
+
+    for page_ind in range(start, end):
+        extract = PageExtract(doc.load_page(page_ind))
+        if extract.is_empty():
+            continue
+
+        fields: PageFields = extract_answer_fields(extract.text)
+        info = APageInfo(page_ind=page_ind, q_id=fields.q_id, answer=fields.answer)
+
+        page_infos.append(info)
 
-        q_id_pat: str = r"Question ID ([0-9a-f]{8})"
-        matches = re.findall(q_id_pat, text)
-        if len(matches) == 1:
+    return page_infos
+
+def _scan_shard(job: tuple) -> list:
+    scan_fn, path, start, end = job
+    return scan_fn(path, start, end)
+
+def scan_pages(scan_fn, path: str, jobs: int) -> list:
+    # NOTE: Scanning (text extraction, regexes, difficulty detection) is the expensive part of
+    #       parsing, and every page can be scanned independently of the others. Only the
+    #       grouping of pages into questions depends on the page order, so that is done after
+    #       all the shards come back.
+    with fitz.open(path) as doc:
+        page_count: int = len(doc)
+
+    if jobs <= 1 or page_count <= 1:
+        return scan_fn(path, 0, page_count)
+
+    shard_count: int = min(jobs, page_count)
+    bounds: list[int] = [(page_count * i) // shard_count for i in range(shard_count + 1)]
+    shards = [(scan_fn, path, bounds[i], bounds[i + 1]) for i in range(shard_count)]
+
+    page_infos: list = []
+    with ProcessPoolExecutor(max_workers=shard_count) as pool:
+        for shard_infos in pool.map(_scan_shard, shards):
+            page_infos.extend(shard_infos)
+
+    return page_infos
+
+def parse_question_pdf(path: str, excluded: bool, jobs: int = 1) -> list[QInfo]:
+    page_infos: list[QPageInfo] = scan_pages(scan_question_pages, path, jobs)
+    q_infos: list[QInfo] = []
+    curr: QInfo = QInfo("", "", "", "easy", "", "", [], False)
+
+    for info in page_infos:
+        if info.q_id is not None:
             if curr.q_id != "":
                 q_infos.append(QInfo(
                     q_id=curr.q_id,
@@ -189,90 +419,54 @@ def parse_question_pdf(path: str, excluded: bool) -> list[QInfo]:
                 ))
                 curr: QInfo = QInfo("", "", "", "easy", "", "", [], False)
 
-            curr.q_id = matches[0]
-
-            difficulty: Level | None = get_difficulty(doc, page, drawing_only=True)
-            if difficulty is None:
-                # This is a backup way of finding the difficulty; it should be able to find
-                # out the difficulty purely through its drawings, but you never know . . .
-                difficulty: Level | None = get_difficulty(doc, page, drawing_only=False)
-                assert difficulty is not None, f"[{path}, pg: {page_ind + 1}] Unable to find difficulty"
+            curr.q_id = info.q_id
 
-            curr.level = difficulty
+            assert info.level is not None
+            curr.level = info.level
         else:
             if curr.q_id == "":
                 # This probably means that one question takes up multiple pages
                 # print(f"No ID found in page {page_num + 1}")
                 continue
 
-        curr.pg_inds.append(page_ind)
+        curr.pg_inds.append(info.page_ind)
 
-        labels_start_ind: int = text.find("Assessment")
-        label_infos = ' '.join(text[labels_start_ind:].split())
-        label_info_pat = r"Assessment (\w*) Test ([\w\s]*) Domain ([\w\s-]*) Skill ([\w\s,:-]*) D"
-        matches = re.findall(label_info_pat, label_infos)
-        if len(matches) == 1:
-            assessment, test, domain, skill = matches[0]
+        if info.labels is not None:
+            assessment, test, domain, skill = info.labels
             # NOTE: this is the same for all questions regardless of difficulty or subject
             # I'm just using it as a sanity check.
             assert assessment == "SAT"
 
             curr.test = test
             curr.domain = domain
-            curr.skill = skill
+            curr.skill = SKILL_NAME_FIXES.get(skill, skill)
 
     q_infos.append(curr)
 
     return q_infos
 
-def parse_answer_pdf(path: str) -> list[AnsInfo]:
-    doc: Document = fitz.open(path)
+def parse_answer_pdf(path: str, jobs: int = 1) -> list[AnsInfo]:
+    page_infos: list[APageInfo] = scan_pages(scan_answer_pages, path, jobs)
     a_infos: list[AnsInfo] = []
     curr: AnsInfo = AnsInfo(q_id="", answer="??", ans_src_pdf="", pg_inds=[])
 
-    for page_ind in range(len(doc)):
-        page = doc.load_page(page_ind)
-        if is_page_empty(page):
-            continue
-
-        text = page.get_text()
-        assert isinstance(text, str)
-
-        q_id_pat: str = r"Question ID ([0-9a-f]{8})"
-        matches = re.findall(q_id_pat, text)
-        if len(matches) == 1:
+    for info in page_infos:
+        if info.q_id is not None:
             if curr.q_id != "":
                 a_infos.append(AnsInfo(curr.q_id, curr.answer, path, curr.pg_inds))
                 curr = AnsInfo(q_id="", answer="??", ans_src_pdf="", pg_inds=[])
 
-            curr.q_id = matches[0]
+            curr.q_id = info.q_id
         else:
             if curr.q_id == "":
                 # This probably means that one question takes up multiple pages
                 # print(f"No ID found in page {page_num + 1}")
                 continue
 
-        curr.pg_inds.append(page_ind)
-
-        patterns = [
-            # NOTE: I have the following patterns in case the first one does not match
-            # 0: Should be common for MCQs and FRQs
-            r"Correct Answer:[\s]([A-Za-z0-9.\/-]+)",
-            # 1: Common for MCQs only
-            r"Choice ([ABCDE]{1}) is correct\.",
-            # 2: Common for FRQs only
-            r"The correct answer is ([A-Za-z0-9.\/-]+)\.",
-            # 3: For a specific question in adv math where a question asks for possible solutions
-            r"The correct answer is either ([A-Za-z0-9.\/, -]+)\.",
-        ]
-        matches = []
-        for pattern in patterns:
-            matches = re.findall(pattern, text)
-            if len(matches) > 0:
-                break
-
-        if len(matches) == 1:
-            curr.answer = matches[0]
+        curr.pg_inds.append(info.page_ind)
+
+        if info.answer is not None:
+            curr.answer = info.answer
 
     return a_infos
 
@@ -317,20 +511,131 @@ def a_infos_to_df(a_infos: list[AnsInfo]) -> pd.DataFrame:
 
     return pd.DataFrame(data)
 
-def parse_all_q_pdfs(file_paths: list[tuple[str, bool]], out_csv: str) -> None:
+def _parse_q_job(job: tuple[str, bool], page_jobs: int = 1) -> list[QInfo]:
+    path, excluded = job
+    return parse_question_pdf(path, excluded, page_jobs)
+
+def _parse_a_job(job: tuple[str, bool], page_jobs: int = 1) -> list[AnsInfo]:
+    path, _ = job
+    return parse_answer_pdf(path, page_jobs)
+
+def parse_in_order(job_fn, file_paths: list[tuple[str, bool]], jobs: int):
+    # NOTE: Results are always yielded in the same order as 'file_paths', regardless of which
+    #       worker finishes first. The merging done by the callers depends on this order (i.e.
+    #       the 'excluded' override for questions and first-wins for answers).
+    if jobs <= 1 or len(file_paths) <= 1:
+        for job in file_paths:
+            yield job_fn(job)
+        return
+
+    with ProcessPoolExecutor(max_workers=min(jobs, len(file_paths))) as pool:
+        yield from pool.map(job_fn, file_paths)
+
+def file_sha256(path: str) -> str:
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha.update(chunk)
+
+    return sha.hexdigest()
+
+def load_parse_manifest(manifest_path: str | None) -> dict[str, dict]:
+    if manifest_path is None or not os.path.exists(manifest_path):
+        return {}
+
+    with open(manifest_path, "r") as f:
+        return json.load(f)
+
+def is_manifest_entry_fresh(entry: dict | None, path: str, excluded: bool) -> bool:
+    if entry is None or entry["excluded"] != excluded:
+        return False
+
+    if entry.get("parser_version") != PARSER_VERSION:
+        return False
+
+    stat = os.stat(path)
+    if stat.st_size != entry["size"]:
+        return False
+
+    if stat.st_mtime == entry["mtime"]:
+        return True
+
+    # NOTE: The file was touched (e.g. copied over again) but that does not mean it changed;
+    #       only the content hash can tell.
+    if file_sha256(path) != entry["sha256"]:
+        return False
+
+    entry["mtime"] = stat.st_mtime
+    return True
+
+def parse_incremental(
+    job_fn,
+    row_cls,
+    file_paths: list[tuple[str, bool]],
+    jobs: int,
+    manifest_path: str | None,
+    force: bool = False,
+):
+    # NOTE: Yields (path, excluded, rows, parsed_at, reused) in the order of 'file_paths'. Only
+    #       files that are new or changed since the last run (according to the manifest) are
+    #       actually parsed; the others reuse the rows stored in the manifest.
+    manifest: dict[str, dict] = {} if force else load_parse_manifest(manifest_path)
+    new_manifest: dict[str, dict] = {}
+
+    stale: list[tuple[str, bool]] = [
+        (path, excluded) for path, excluded in file_paths
+        if not is_manifest_entry_fresh(manifest.get(path), path, excluded)
+    ]
+    parsed = parse_in_order(job_fn, stale, jobs)
+
+    for path, excluded in file_paths:
+        if (path, excluded) in stale:
+            rows = next(parsed)
+            stat = os.stat(path)
+            entry: dict = {
+                "parsed_at": str(dt.datetime.now()),
+                "parser_version": PARSER_VERSION,
+                "excluded": excluded,
+                "sha256": file_sha256(path),
+                "size": stat.st_size,
+                "mtime": stat.st_mtime,
+                "rows": [asdict(row) for row in rows],
+            }
+            reused = False
+        else:
+            entry: dict = manifest[path]
+            rows = [row_cls(**row) for row in entry["rows"]]
+            reused = True
+
+        new_manifest[path] = entry
+        yield path, excluded, rows, entry["parsed_at"], reused
+
+    if manifest_path is not None:
+        with open(manifest_path, "w") as f:
+            json.dump(new_manifest, f)
+
+def parse_all_q_pdfs(
+    file_paths: list[tuple[str, bool]],
+    out_csv: str,
+    jobs: int = 1,
+    page_jobs: int = 1,
+    manifest_path: str | None = "q_parse_manifest.json",
+    force: bool = False,
+) -> None:
     meta_info_list: list[dict] = []
     all_q_infos: list[QInfo] = []
 
-    for path, excluded in file_paths:
+    timer.start()
+    job_fn = partial(_parse_q_job, page_jobs=page_jobs)
+    parsed = parse_incremental(job_fn, QInfo, file_paths, jobs, manifest_path, force)
+    for path, excluded, q_infos, parsed_at, reused in parsed:
         meta_info_list.append({
-            "parsed_at": str(dt.datetime.now()),
+            "parsed_at": parsed_at,
             "source_pdf": path,
             "excluded": excluded,
         })
 
         # output_name = pdf_parsed_output_name(path)
-        timer.start()
-        q_infos: list[QInfo] = parse_question_pdf(path, excluded)
         all_q_ids_so_far = [aq.q_id for aq in all_q_infos]
         for q_info in q_infos:
             # NOTE: if it is the second time, I come across this question, it must mean that
@@ -345,7 +650,8 @@ def parse_all_q_pdfs(file_paths: list[tuple[str, bool]], out_csv: str) -> None:
 
             all_q_infos.append(q_info)
 
-        timer.stop(f"Completed parsing '{path}'")
+        timer.stop(f"{'Reused cached parse of' if reused else 'Completed parsing'} '{path}'")
+        timer.start()
 
         # NOTE: deduplication does not have to always happen
         # dedup_doc: Document = dedup_ssqb_pdfs(path)
@@ -357,32 +663,41 @@ def parse_all_q_pdfs(file_paths: list[tuple[str, bool]], out_csv: str) -> None:
 
     combined_df: pd.DataFrame = q_infos_to_df(all_q_infos)
     combined_df.to_csv(out_csv, index=False)
+    QuestionBank.from_q_infos(all_q_infos).save(q_bank_path(out_csv))
 
     with open("q_meta_infos.json", "w") as f:
         json.dump(meta_info_list, f, indent=4)
 
-def parse_all_a_pdfs(file_paths: list[tuple[str, bool]], out_csv: str) -> None:
+def parse_all_a_pdfs(
+    file_paths: list[tuple[str, bool]],
+    out_csv: str,
+    jobs: int = 1,
+    page_jobs: int = 1,
+    manifest_path: str | None = "a_parse_manifest.json",
+    force: bool = False,
+) -> None:
     meta_info_list: list[dict] = []
     all_a_infos: list[AnsInfo] = []
 
-    for path, excluded in file_paths:
+    timer.start()
+    job_fn = partial(_parse_a_job, page_jobs=page_jobs)
+    parsed = parse_incremental(job_fn, AnsInfo, file_paths, jobs, manifest_path, force)
+    for path, excluded, a_infos, parsed_at, reused in parsed:
         meta_info_list.append({
-            "parsed_at": str(dt.datetime.now()),
+            "parsed_at": parsed_at,
             "source_pdf": path,
             "excluded": excluded,
         })
 
         # output_name = pdf_parsed_output_name(path)
-        timer.start()
-
-        a_infos: list[AnsInfo] = parse_answer_pdf(path)
         all_a_ids_so_far = [aa.q_id for aa in all_a_infos]
         for a_info in a_infos:
             # NOTE: all_a_infos should contain only unique items
             if a_info.q_id not in all_a_ids_so_far:
                 all_a_infos.append(a_info)
 
-        timer.stop(f"Completed parsing '{path}'")
+        timer.stop(f"{'Reused cached parse of' if reused else 'Completed parsing'} '{path}'")
+        timer.start()
 
         # NOTE: deduplication does not have to always happen
         # dedup_doc: Document = dedup_ssqb_pdfs(path)
@@ -398,38 +713,49 @@ def parse_all_a_pdfs(file_paths: list[tuple[str, bool]], out_csv: str) -> None:
     with open("a_meta_infos.json", "w") as f:
         json.dump(meta_info_list, f, indent=4)
 
+def split_pages_column(pages: pd.Series) -> list[list[int]]:
+    # NOTE: Splits every "3_4_5" style page string of the column at once: all of them are joined
+    #       into one string, split and converted in one go, then cut back up per row.
+    pages_strs: list[str] = pages.astype(str).tolist()
+    counts = np.fromiter(
+        (pages_str.count(PAGE_DELIMITER) + 1 for pages_str in pages_strs),
+        dtype=np.int64,
+        count=len(pages_strs),
+    )
+    offsets: list[int] = [0] + np.cumsum(counts).tolist()
+
+    flat: list[int] = []
+    if len(pages_strs) > 0:
+        flat = (np.array(PAGE_DELIMITER.join(pages_strs).split(PAGE_DELIMITER), dtype=np.int64) - 1).tolist()
+
+    return [flat[offsets[i]:offsets[i + 1]] for i in range(len(pages_strs))]
+
+def assert_str_column(df: pd.DataFrame, col: str, name: str) -> list[str]:
+    values: list = df[col].tolist()
+    for i, value in enumerate(values):
+        assert isinstance(value, str), f"Expected {name} to be a str: {name} = '{value}' @ {i}"
+
+    return values
+
 def import_q_parsed_info(path: str) -> list[QInfo]:
     all_df = pd.read_csv(path)
-    q_infos: list[QInfo] = []
-
-    for i in range(len(all_df)):
-        pages_str = str(all_df["Pages"][i])
-        assert isinstance(pages_str, str)
-
-        pages_str: list[str] = pages_str.split(PAGE_DELIMITER)
-        pg_inds: list[int] = [int(pages_str[0]) - 1]
-        for pg_no_str in pages_str[1:]:
-            pg_inds.append(int(pg_no_str) - 1)
-
-        q_id = all_df["ID"][i]
-        test = all_df["Test"][i]
-        domain = all_df["Domain"][i]
-        level = all_df["Difficulty"][i]
-        excluded = bool(all_df["Excluded"][i])
-        skill = all_df["Skill"][i]
-        src_pdf = all_df["Source_PDF"][i]
-
-        assert isinstance(q_id, str), f"Expected q_id to be a str: q_id = '{q_id}'"
-        assert isinstance(test, str), f"Expected test to be a str: test = '{test}' @ {i}"
-        assert isinstance(domain, str), f"Expected domain to be a str: domain = '{domain}'"
-        assert isinstance(level, str) and level in ["easy", "medium", "hard"], (
-            f"Expected level to be a str: level = '{level}'"
-        )
-        assert isinstance(excluded, bool), f"Expected excluded to be a bool: excluded = '{excluded}'"
-        assert isinstance(skill, str), f"Expected skill to be a str: skill = '{skill}'"
-        assert isinstance(src_pdf, str), f"Expected src_pdf to be a str: src_pdf = '{src_pdf}'"
 
-        q_infos.append(QInfo(
+    q_ids = assert_str_column(all_df, "ID", "q_id")
+    tests = assert_str_column(all_df, "Test", "test")
+    domains = assert_str_column(all_df, "Domain", "domain")
+    levels = assert_str_column(all_df, "Difficulty", "level")
+    skills = assert_str_column(all_df, "Skill", "skill")
+    src_pdfs = assert_str_column(all_df, "Source_PDF", "src_pdf")
+    excludeds: list[bool] = all_df["Excluded"].astype(bool).tolist()
+    all_pg_inds: list[list[int]] = split_pages_column(all_df["Pages"])
+
+    bad_levels = ~all_df["Difficulty"].isin(["easy", "medium", "hard"])
+    assert not bad_levels.any(), (
+        f"Expected level to be one of easy/medium/hard: level = '{all_df['Difficulty'][bad_levels].iloc[0]}'"
+    )
+
+    return [
+        QInfo(
             q_id=q_id,
             test=test,
             domain=domain,
@@ -438,31 +764,519 @@ def import_q_parsed_info(path: str) -> list[QInfo]:
             excluded=excluded,
             src_pdf=src_pdf,
             pg_inds=pg_inds
-        ))
-
-    return q_infos
+        )
+        for q_id, test, domain, skill, level, excluded, src_pdf, pg_inds in zip(
+            q_ids, tests, domains, skills, levels, excludeds, src_pdfs, all_pg_inds
+        )
+    ]
 
 def import_a_parsed_info(path: str) -> list[AnsInfo]:
     all_df = pd.read_csv(path)
-    a_infos: list[AnsInfo] = []
 
-    for i in range(len(all_df)):
-        pages_str = all_df["Pages"][i]
-        assert isinstance(pages_str, str)
+    q_ids = assert_str_column(all_df, "ID", "q_id")
+    answers = assert_str_column(all_df, "Answer", "answer")
+    ans_src_pdfs = assert_str_column(all_df, "Answer_PDF", "ans_src_pdf")
+    all_pg_inds: list[list[int]] = split_pages_column(all_df["Pages"])
+
+    return [
+        AnsInfo(q_id=q_id, answer=answer, ans_src_pdf=ans_src_pdf, pg_inds=pg_inds)
+        for q_id, answer, ans_src_pdf, pg_inds in zip(q_ids, answers, ans_src_pdfs, all_pg_inds)
+    ]
+
+# NOTE: Binary, columnar version of the parsed question CSV. Test/domain/skill/difficulty/source
+#       are stored as small integer codes into their category arrays and the page indices of all
+#       questions are packed into one flat array (question i owns pages[offsets[i]:offsets[i+1]]).
+#       Loading it is just reading a handful of numpy arrays; no text parsing is involved.
+Q_BANK_VERSION: int = 1
+Q_BANK_CATEGORICALS: dict[str, str] = {
+    "test": "Test",
+    "domain": "Domain",
+    "skill": "Skill",
+    "level": "Difficulty",
+    "src_pdf": "Source_PDF",
+}
+
+def q_bank_path(q_csv_path: str) -> str:
+    return os.path.splitext(q_csv_path)[0] + ".npz"
+
+class QRow:
+    # NOTE: Lightweight view of one question in a QuestionBank; it has the same attributes (and
+    #       the same id based equality/hash) as QInfo but does not hold any of the data itself.
+    __slots__ = ("bank", "ind")
+
+    def __init__(self, bank: "QuestionBank", ind: int) -> None:
+        self.bank: QuestionBank = bank
+        self.ind: int = ind
+
+    @property
+    def q_id(self) -> str:
+        return self.bank.ids[self.ind]
+
+    @property
+    def test(self) -> str:
+        return self.bank.category("test", self.ind)
+
+    @property
+    def domain(self) -> str:
+        return self.bank.category("domain", self.ind)
+
+    @property
+    def level(self) -> Level:
+        return self.bank.category("level", self.ind)
+
+    @property
+    def skill(self) -> str:
+        return self.bank.category("skill", self.ind)
+
+    @property
+    def src_pdf(self) -> str:
+        return self.bank.category("src_pdf", self.ind)
+
+    @property
+    def pg_inds(self) -> list[int]:
+        # NOTE: A new list every time, so callers are free to modify it
+        return self.bank.page_inds(self.ind)
+
+    @property
+    def excluded(self) -> bool:
+        return bool(self.bank.excluded[self.ind])
+
+    def to_q_info(self) -> QInfo:
+        return QInfo(
+            q_id=self.q_id,
+            test=self.test,
+            domain=self.domain,
+            level=self.level,
+            skill=self.skill,
+            src_pdf=self.src_pdf,
+            pg_inds=self.pg_inds,
+            excluded=self.excluded,
+        )
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, (QInfo, QRow)) and self.q_id == other.q_id
 
-        pages: list[str] = pages_str.split(PAGE_DELIMITER)
-        pg_inds: list[int] = []
-        for pg_ind in pages:
-            pg_inds.append(int(pg_ind) - 1)
+    def __hash__(self) -> int:
+        return hash((self.q_id, self.domain, self.skill, self.pg_inds[0]))
 
-        q_id = all_df["ID"][i]
-        answer = all_df["Answer"][i]
-        ans_src_pdf = all_df["Answer_PDF"][i]
+    def __repr__(self) -> str:
+        return repr(self.to_q_info()).replace("QInfo(", "QRow(", 1)
 
-        assert isinstance(q_id, str), f"Expected q_id to be a str: q_id: '{q_id}'"
-        assert isinstance(answer, str), f"Expected answer to be a str: answer: '{answer}'"
-        assert isinstance(ans_src_pdf, str), f"Expected ans_src_pdf to be a str: ans_src_pdf: '{ans_src_pdf}'"
+class QuestionBank:
+    # NOTE: Columnar store of all the questions; iterating over it (or indexing it) gives QRow
+    #       views, so it can be used anywhere a list[QInfo] is only read from.
+    def __init__(self, arrays: dict[str, np.ndarray]) -> None:
+        assert int(arrays["version"]) == Q_BANK_VERSION, (
+            f"Expected question bank version {Q_BANK_VERSION}: got {int(arrays['version'])}"
+        )
+        self.arrays: dict[str, np.ndarray] = arrays
+
+        # NOTE: These get looked up per row, so plain python objects are faster than going
+        #       through numpy scalars every time. The category strings are shared by every row.
+        self.ids: list[str] = arrays["ids"].tolist()
+        self.categories: dict[str, list[str]] = {
+            attr: [sys.intern(c) for c in arrays[f"{attr}_categories"].tolist()]
+            for attr in Q_BANK_CATEGORICALS
+        }
+        self.codes: dict[str, np.ndarray] = {
+            attr: arrays[f"{attr}_codes"] for attr in Q_BANK_CATEGORICALS
+        }
+        self.excluded: np.ndarray = arrays["excluded"]
+        self.page_offsets: np.ndarray = arrays["page_offsets"]
+        self.pages: np.ndarray = arrays["pages"]
+
+    @classmethod
+    def from_q_infos(cls, q_infos: list[QInfo]) -> "QuestionBank":
+        arrays: dict[str, np.ndarray] = {
+            "version": np.array(Q_BANK_VERSION),
+            "ids": np.array([info.q_id for info in q_infos], dtype=str),
+            "excluded": np.array([info.excluded for info in q_infos], dtype=np.bool_),
+        }
+
+        for attr in Q_BANK_CATEGORICALS:
+            values = np.array([getattr(info, attr) for info in q_infos], dtype=str)
+            categories, codes = np.unique(values, return_inverse=True)
+            arrays[f"{attr}_categories"] = categories
+            arrays[f"{attr}_codes"] = codes.astype(np.int16)
+
+        page_counts = np.array([len(info.pg_inds) for info in q_infos], dtype=np.int64)
+        arrays["page_offsets"] = np.concatenate(([0], np.cumsum(page_counts)))
+        arrays["pages"] = np.array(
+            [pg_ind for info in q_infos for pg_ind in info.pg_inds], dtype=np.int32
+        )
 
-        a_infos.append(AnsInfo(q_id=q_id, answer=answer, ans_src_pdf=ans_src_pdf, pg_inds=pg_inds))
+        return cls(arrays)
+
+    @classmethod
+    def load(cls, path: str) -> "QuestionBank":
+        with np.load(path, allow_pickle=False) as f:
+            return cls({name: f[name] for name in f.files})
+
+    def save(self, path: str) -> None:
+        # NOTE: Other processes may be loading (or rebuilding) the same bank at the same time, so
+        #       it's written next to 'path' and only then moved over it
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".npz.tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, **self.arrays)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, ind: int) -> QRow:
+        if ind < 0:
+            ind += len(self)
+        if not 0 <= ind < len(self):
+            raise IndexError(f"question bank index out of range: {ind}")
+        return QRow(self, ind)
+
+    def __iter__(self):
+        for ind in range(len(self)):
+            yield QRow(self, ind)
+
+    def category(self, attr: str, ind: int) -> str:
+        return self.categories[attr][self.codes[attr][ind]]
+
+    def column(self, attr: str) -> np.ndarray:
+        return self.arrays[f"{attr}_categories"][self.codes[attr]]
+
+    def page_inds(self, ind: int) -> list[int]:
+        return self.pages[self.page_offsets[ind]:self.page_offsets[ind + 1]].tolist()
+
+    def to_q_infos(self) -> list[QInfo]:
+        return [row.to_q_info() for row in self]
+
+    def to_df(self) -> pd.DataFrame:
+        # NOTE: Same columns (and column order) as q_infos_to_df
+        offsets: list[int] = self.page_offsets.tolist()
+        pages: list[int] = self.pages.tolist()
+
+        return pd.DataFrame({
+            "ID": self.arrays["ids"].astype(object),
+            "Pages": [pages_as_str(pages[offsets[i]:offsets[i + 1]]) for i in range(len(self))],
+            "Difficulty": self.column("level").astype(object),
+            "Excluded": self.excluded,
+            "Test": self.column("test").astype(object),
+            "Domain": self.column("domain").astype(object),
+            "Skill": self.column("skill").astype(object),
+            "Source_PDF": self.column("src_pdf").astype(object),
+        })
 
-    return a_infos
+def load_question_bank(q_csv_path: str) -> QuestionBank:
+    # NOTE: The CSV stays the source of truth (and the human readable export); the bank next to it
+    #       is (re)built from it whenever it is missing or older than the CSV.
+    bank_path: str = q_bank_path(q_csv_path)
+    if (os.path.exists(bank_path)
+        and os.path.getmtime(bank_path) >= os.path.getmtime(q_csv_path)):
+        try:
+            return QuestionBank.load(bank_path)
+        except (AssertionError, KeyError, ValueError, EOFError, OSError, zipfile.BadZipFile) as e:
+            print(f"WARN: Ignoring unreadable question bank '{bank_path}': {e}")
+
+    bank = QuestionBank.from_q_infos(import_q_parsed_info(q_csv_path))
+    try:
+        bank.save(bank_path)
+    except OSError as e:
+        print(f"WARN: Could not write question bank '{bank_path}': {e}")
+
+    return bank
+
+# NOTE: Every answer in the bank is turned into the set of responses it accepts once, when the
+#       bank is loaded, so grading never has to run a regex over the answers. An answer can list
+#       several acceptable values (i.e. "10/3, 15/4, or 25/6"); each of them counts.
+ANSWER_NORMS_VERSION: int = 1
+ANSWER_ALTERNATIVES_RE: re.Pattern = re.compile(r"\s*(?:,\s*or\s+|,|\s+or\s+|;)\s*")
+FRACTION_RE: re.Pattern = re.compile(r"(-?)(\d+)\s*/\s*(\d+)")
+DECIMAL_RE: re.Pattern = re.compile(r"-?(?:\d+\.?\d*|\.\d+)")
+CHOICE_RE: re.Pattern = re.compile(r"[A-E]")
+# Two numeric answers within this of each other are the same answer
+NUMERIC_TOLERANCE: float = 1e-3
+
+def parse_answer_value(text: str) -> float | None:
+    # The value of 'text' if it is (only) a fraction or a decimal
+    text = text.strip()
+    match = FRACTION_RE.fullmatch(text)
+    if match is not None:
+        sign, num, den = match.groups()
+        if int(den) == 0:
+            return None
+        value: float = int(num) / int(den)
+        return -value if sign else value
+
+    if DECIMAL_RE.fullmatch(text) is not None:
+        return float(text)
+
+    return None
+
+def canonical_response(text: str) -> str:
+    return text.strip().upper()
+
+@dataclass
+class NormAnswer:
+    # Responses accepted as they are (after canonical_response); the whole answer always is
+    choices: list[str]
+    # Numeric values accepted (within NUMERIC_TOLERANCE)
+    values: list[float]
+
+    def accepts(self, response: str) -> bool:
+        canon: str = canonical_response(response)
+        if canon in self.choices:
+            return True
+
+        value: float | None = parse_answer_value(canon)
+        return value is not None and any(
+            abs(value - v) < NUMERIC_TOLERANCE for v in self.values
+        )
+
+def normalise_answer(answer: str) -> NormAnswer:
+    norm = NormAnswer(choices=[canonical_response(answer)], values=[])
+    for alt in ANSWER_ALTERNATIVES_RE.split(answer.strip()):
+        if alt == "":
+            continue
+
+        value: float | None = parse_answer_value(alt)
+        if value is not None:
+            if value not in norm.values:
+                norm.values.append(value)
+        elif CHOICE_RE.fullmatch(canonical_response(alt)) is not None:
+            if canonical_response(alt) not in norm.choices:
+                norm.choices.append(canonical_response(alt))
+
+    return norm
+
+def answer_norms_path(a_csv_path: str) -> str:
+    return os.path.splitext(a_csv_path)[0] + "-norms.json"
+
+def load_answer_norms(a_csv_path: str, a_infos: list[AnsInfo]) -> dict[str, NormAnswer]:
+    # answer text -> NormAnswer, for every answer in 'a_infos'. Same as the question bank, the
+    # cache next to the CSV gets rebuilt whenever it is missing or older than the CSV.
+    norms_path: str = answer_norms_path(a_csv_path)
+    cached: dict[str, list] = {}
+    if (os.path.exists(norms_path)
+        and os.path.getmtime(norms_path) >= os.path.getmtime(a_csv_path)):
+        try:
+            with open(norms_path, "r") as f:
+                cache: dict = json.load(f)
+            if cache.get("version") == ANSWER_NORMS_VERSION:
+                cached = dict(cache["answers"])
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            print(f"WARN: Ignoring unreadable answer norms '{norms_path}': {e}")
+
+    norms: dict[str, NormAnswer] = {}
+    for a_info in a_infos:
+        if a_info.answer in norms:
+            continue
+
+        try:
+            choices, values = cached[a_info.answer]
+            norms[a_info.answer] = NormAnswer(choices=list(choices), values=list(values))
+        except (KeyError, TypeError, ValueError):
+            norms[a_info.answer] = normalise_answer(a_info.answer)
+
+    if len(norms) != len(cached) or any(answer not in cached for answer in norms):
+        # NOTE: Written the same way as the question bank (see QuestionBank.save), since other
+        #       processes may be reading it right now
+        tmp_path: str | None = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(
+                dir=os.path.dirname(norms_path) or ".", suffix=".json.tmp"
+            )
+            with os.fdopen(fd, "w") as f:
+                json.dump({
+                    "version": ANSWER_NORMS_VERSION,
+                    "answers": {
+                        answer: [norm.choices, norm.values] for answer, norm in norms.items()
+                    },
+                }, f)
+            os.replace(tmp_path, norms_path)
+        except OSError as e:
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            print(f"WARN: Could not write answer norms '{norms_path}': {e}")
+
+    return norms
+
+@dataclass
+class AnswerKey:
+    # NOTE: An answer key csv with every answer already normalised (see normalise_answer),
+    #       so that any number of response sheets can be graded against it with array operations
+    q_ids: list[str]
+    answers: np.ndarray
+    # (questions, most choices/values of any answer); padded with "" and nan
+    choices: np.ndarray
+    values: np.ndarray
+
+    @classmethod
+    def from_csv(cls, ans_key_path: str, norm_answer) -> "AnswerKey":
+        q_ids, answers = read_answer_csv(ans_key_path)
+        assert len(set(q_ids)) == len(q_ids), f"Duplicate question ids in '{ans_key_path}'"
+
+        norms: list[NormAnswer] = [norm_answer(ans) for ans in answers]
+        choice_count: int = max([len(norm.choices) for norm in norms], default=0)
+        value_count: int = max([len(norm.values) for norm in norms], default=0)
+
+        return cls(
+            q_ids=q_ids,
+            answers=np.array(answers, dtype=str),
+            choices=np.array(
+                [norm.choices + [""] * (choice_count - len(norm.choices)) for norm in norms],
+                dtype=str,
+            ).reshape(len(norms), choice_count),
+            values=np.array(
+                [norm.values + [np.nan] * (value_count - len(norm.values)) for norm in norms],
+                dtype=np.float64,
+            ).reshape(len(norms), value_count),
+        )
+
+    def response_matrix(self, response_paths: list[str]) -> np.ndarray:
+        # (students, questions) responses in key order; unanswered and missing questions are ""
+        inds: dict[str, int] = {q_id: ind for ind, q_id in enumerate(self.q_ids)}
+        rows: list[list[str]] = []
+        for path in response_paths:
+            row: list[str] = [""] * len(self.q_ids)
+            for q_id, res in zip(*read_answer_csv(path)):
+                if q_id not in inds:
+                    print(f"WARN: '{path}' answers {q_id} which is not in the answer key")
+                    continue
+                row[inds[q_id]] = res
+            rows.append(row)
+
+        return np.array(rows, dtype=str).reshape(len(rows), len(self.q_ids))
+
+    def grade(self, responses: np.ndarray) -> np.ndarray:
+        # Which of the (students, questions) responses are correct
+        # NOTE: Every distinct response is normalised only once, however many students gave it
+        uniq, inverse = np.unique(responses, return_inverse=True)
+        uniq_canon = np.array([canonical_response(res) for res in uniq], dtype=str)
+        uniq_values = np.array([
+            np.nan if (value := parse_answer_value(res)) is None else value
+            for res in uniq
+        ], dtype=np.float64)
+        canon = uniq_canon[inverse].reshape(responses.shape)
+        values = uniq_values[inverse].reshape(responses.shape)
+
+        answered = canon != ""
+        chosen = (canon[:, :, np.newaxis] == self.choices[np.newaxis, :, :]).any(axis=2)
+        with np.errstate(invalid="ignore"):
+            numeric = (
+                np.abs(values[:, :, np.newaxis] - self.values[np.newaxis, :, :])
+                < NUMERIC_TOLERANCE
+            ).any(axis=2)
+
+        return answered & (chosen | numeric)
+
+def read_answer_csv(csv_path: str) -> tuple[list[str], list[str]]:
+    # (question ids, answers) of an answer key/response csv; empty answers stay ""
+    with open(csv_path, "r", newline="") as f:
+        reader = csv.DictReader(f)
+        q_ids: list[str] = []
+        answers: list[str] = []
+        for row in reader:
+            q_ids.append(row["Question ID"])
+            answers.append(row["Answers"] or "")
+
+    return q_ids, answers
+
+def question_page_range(pg_inds: list[int], src_pdf: str = "") -> range:
+    # NOTE: The pages a question takes up in its source pdf (including the empty ones in between)
+    page_nos: list[int] = list(pg_inds)
+    if len(page_nos) == 1:
+        page_nos.append(page_nos[0])
+
+    assert len(page_nos) <= 3, (
+        f"A page range should have a max of 3 numbers -> pages: {page_nos}; src = '{src_pdf}'"
+    )
+
+    return range(page_nos[0], page_nos[1] + 1)
+
+# NOTE: Optional store of every question's non-empty pages as their own small pdf, so that a
+#       question set can be put together without opening the (large) source pdfs at all. The
+#       fragments of a source pdf live in a directory named after the source's content hash,
+#       which makes rebuilding the store after a parse only redo the sources that changed.
+#       The index records which pages every fragment was cut from; a fragment is only used if
+#       those still match the bank.
+FRAGMENT_STORE_VERSION: int = 1
+FRAGMENT_INDEX_NAME: str = "index.json"
+
+def fragment_index_path(store_dir: str) -> str:
+    return os.path.join(store_dir, FRAGMENT_INDEX_NAME)
+
+def load_fragment_index(store_dir: str) -> dict[str, dict]:
+    # src_pdf -> {"sha256": ..., "dir": ..., "questions": {q_id: pg_inds}}
+    index_path: str = fragment_index_path(store_dir)
+    if not os.path.exists(index_path):
+        return {}
+
+    with open(index_path, "r") as f:
+        index: dict = json.load(f)
+
+    if index.get("version") != FRAGMENT_STORE_VERSION:
+        print(f"WARN: Ignoring fragment store '{store_dir}' of version {index.get('version')}")
+        return {}
+
+    return index["sources"]
+
+def _build_source_fragments(job: tuple[str, str, list[tuple[str, list[int]]]]) -> int:
+    src_pdf, out_dir, questions = job
+    os.makedirs(out_dir, exist_ok=True)
+
+    built: int = 0
+    with fitz.open(src_pdf) as doc:
+        for q_id, pg_inds in questions:
+            out_path: str = os.path.join(out_dir, f"{q_id}.pdf")
+            if os.path.exists(out_path):
+                continue
+
+            fragment: Document = Document()
+            for pg_no in question_page_range(pg_inds, src_pdf):
+                if not is_page_empty(doc.load_page(pg_no)):
+                    fragment.insert_pdf(doc, from_page=pg_no, to_page=pg_no)
+
+            # NOTE: Written to a temporary name first so that a fragment either exists completely
+            #       or not at all (i.e. if the build gets interrupted)
+            fragment.save(out_path + ".tmp", garbage=3, deflate=True)
+            os.replace(out_path + ".tmp", out_path)
+            built += 1
+
+    return built
+
+def build_fragment_store(q_infos: list[QInfo], store_dir: str, jobs: int = 1) -> None:
+    by_src: dict[str, dict[str, list[int]]] = {}
+    for q_info in q_infos:
+        by_src.setdefault(q_info.src_pdf, {})[q_info.q_id] = list(q_info.pg_inds)
+
+    sources: dict[str, dict] = {}
+    src_jobs: list[tuple[str, str, list[tuple[str, list[int]]]]] = []
+    for src_pdf, questions in by_src.items():
+        if not os.path.exists(src_pdf):
+            print(f"WARN: Skipping fragments of missing source pdf '{src_pdf}'")
+            continue
+
+        sha256: str = file_sha256(src_pdf)
+        # NOTE: The pages are part of the key too; a different parse of the same pdf gets its
+        #       own directory.
+        key = hashlib.sha256(json.dumps([sha256, sorted(questions.items())]).encode())
+        frag_dir: str = key.hexdigest()[:16]
+
+        sources[src_pdf] = {"sha256": sha256, "dir": frag_dir, "questions": questions}
+        src_jobs.append((src_pdf, os.path.join(store_dir, frag_dir), list(questions.items())))
+
+    timer.start()
+    built_counts = parse_in_order(_build_source_fragments, src_jobs, jobs)
+    for (src_pdf, _, _), built in zip(src_jobs, built_counts):
+        timer.stop(f"Built {built} fragments of '{src_pdf}' ({len(sources[src_pdf]['questions'])} total)")
+        timer.start()
+
+    with open(fragment_index_path(store_dir), "w") as f:
+        json.dump({"version": FRAGMENT_STORE_VERSION, "sources": sources}, f)
+
+    # Fragments cut from older versions of the sources (or from older parses) are not used anymore
+    frag_dirs: set[str] = {source["dir"] for source in sources.values()}
+    for entry in os.listdir(store_dir):
+        entry_path: str = os.path.join(store_dir, entry)
+        if os.path.isdir(entry_path) and entry not in frag_dirs:
+            shutil.rmtree(entry_path)
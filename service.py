@@ -0,0 +1,172 @@
+import contextlib
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import prepare
+
+
+class GeneratorHandler(BaseHTTPRequestHandler):
+    # NOTE: Set by serve(); every request is answered by the same, already loaded QGeneration,
+    #       each on a thread of its own. PyMuPDF is not thread-safe, so anything that touches
+    #       fitz documents in this process goes through fitz_work(). With a pdf pool the sets
+    #       are assembled in the worker processes, so only regen-ans still has to.
+    qg = None
+    # How many sets can be put together at once (the size of the pdf pool)
+    pdf_jobs = 1
+    fitz_lock = threading.Lock()
+
+    def fitz_work(self, uses_pdf_pool: bool = False):
+        if uses_pdf_pool and self.qg.pdf_pool is not None:
+            return contextlib.nullcontext()
+        return self.fitz_lock
+
+    def send_json(
+        self, status: int, payload: dict | list | bytes, headers: dict | None = None
+    ) -> None:
+        # NOTE: bytes are sent as they are (already serialised json, e.g. an artifact)
+        headers = headers or {}
+        body = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", headers.get("Content-Type", "application/json"))
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers.items():
+            if name != "Content-Type":
+                self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_artifact(self, name: str) -> tuple[int, bytes, dict]:
+        data, etag = self.qg.read_artifact(name)
+        headers = {"ETag": f'"{etag}"', "Cache-Control": "no-cache"}
+        if f'"{etag}"' in self.headers.get("If-None-Match", "").split(", "):
+            return 304, b"", headers
+        return 200, data, headers
+
+    def read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if not isinstance(body, dict):
+            raise TypeError(f"Expected a json object as the request body: got {type(body)}")
+
+        return body
+
+    def handle_route(self, routes: dict) -> None:
+        url = urlparse(self.path)
+        route = routes.get(url.path)
+        if route is None:
+            self.send_json(404, {"error": f"Unknown route: '{url.path}'"})
+            return
+
+        timer = prepare.Timer()
+        headers: dict = {}
+        try:
+            status, payload, *rest = route(self, parse_qs(url.query))
+            if rest:
+                headers = rest[0]
+        except FileNotFoundError as e:
+            status, payload = 404, {"error": f"{type(e).__name__}: {e}"}
+        except (KeyError, TypeError, ValueError, AssertionError) as e:
+            status, payload = 400, {"error": f"{type(e).__name__}: {e}"}
+        except Exception as e:
+            status, payload = 500, {"error": f"{type(e).__name__}: {e}"}
+
+        self.send_json(status, payload, headers)
+        timer.stop(f"{self.command} {url.path} -> {status}")
+
+    def do_GET(self) -> None:
+        self.handle_route({
+            "/health": GeneratorHandler.get_health,
+            "/allids": GeneratorHandler.get_allids,
+            "/skilltree": GeneratorHandler.get_skilltree,
+        })
+
+    def do_POST(self) -> None:
+        self.handle_route({
+            "/qset": GeneratorHandler.post_qset,
+            "/qset/pdf": GeneratorHandler.post_qset_pdf,
+            "/regen-ans": GeneratorHandler.post_regen_ans,
+            "/grade": GeneratorHandler.post_grade,
+        })
+
+    def get_health(self, query: dict) -> tuple[int, dict]:
+        return 200, {
+            "questions": len(self.qg.q_infos),
+            "openPdfs": len(self.qg.src_docs),
+            "pdfJobs": self.pdf_jobs,
+        }
+
+    def get_allids(self, query: dict) -> tuple[int, bytes, dict]:
+        return self.send_artifact("qids")
+
+    def get_skilltree(self, query: dict) -> tuple[int, bytes, dict]:
+        w_difficulty = query.get("difficulty", ["0"])[0] in ["1", "true"]
+        return self.send_artifact("skill-tree-difficulty" if w_difficulty else "skill-tree")
+
+    def post_qset(self, query: dict) -> tuple[int, dict]:
+        input_json = self.read_json()
+        with self.fitz_work(uses_pdf_pool=True):
+            chosen = self.qg.create_question_set_v2(input_json)
+        output_path = self.qg.get_output_path(
+            input_json["cohort"], input_json["folder"], input_json["filename"]
+        )
+        payload: dict = {"outputPath": output_path, "count": len(chosen)}
+        if len(chosen) > 0:
+            payload["bytes"] = os.path.getsize(output_path)
+        return 200, payload
+
+    def post_qset_pdf(self, query: dict) -> tuple[int, dict | bytes, dict]:
+        # The pdf itself is the response; it is only also saved (with the answer csvs) to
+        # cohort/folder/filename if asked for with ?persist=1
+        input_json = self.read_json()
+        persist = query.get("persist", ["0"])[0] in ["1", "true"]
+        with self.fitz_work(uses_pdf_pool=True):
+            chosen, data = self.qg.stream_question_set(input_json, persist)
+        if len(chosen) == 0:
+            return 422, {"error": "No questions matched the filters"}, {}
+
+        filename = os.path.basename(input_json["filename"].strip()).removesuffix(".pdf") + ".pdf"
+        return 200, data, {
+            "Content-Type": "application/pdf",
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "X-Question-Count": str(len(chosen)),
+        }
+
+    def post_regen_ans(self, query: dict) -> tuple[int, dict]:
+        body = self.read_json()
+        with self.fitz_work():
+            self.qg.derive_answers_from_qpdf(body["inPdf"], body["outPdf"])
+        return 200, {"outputPath": body["outPdf"]}
+
+    def post_grade(self, query: dict) -> tuple[int, dict]:
+        body = self.read_json()
+        correct, total = self.qg.check_answers(body["responses"], body["key"])
+        return 200, {"correct": correct, "total": total}
+
+
+def serve(qg, host: str = "127.0.0.1", port: int = 8081, jobs: int = 1) -> None:
+    GeneratorHandler.qg = qg
+    GeneratorHandler.pdf_jobs = max(jobs, 1)
+
+    # Open the source pdfs up front so that not even the first qset has to (as many of them as
+    # the open pdf cache holds)
+    src_pdfs = sorted(set(qg.q_infos.categories["src_pdf"]))[:qg.max_open_src_pdfs]
+    if jobs > 1:
+        qg.start_pdf_pool(jobs, src_pdfs)
+    else:
+        for src_pdf in src_pdfs:
+            if os.path.exists(src_pdf):
+                qg.open_src_pdf(src_pdf)
+
+    server = ThreadingHTTPServer((host, port), GeneratorHandler)
+    print(f"Generator listening at http://{host}:{port} ({jobs} pdf job(s))")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if qg.pdf_pool is not None:
+            qg.pdf_pool.shutdown()
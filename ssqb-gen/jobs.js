@@ -0,0 +1,141 @@
+import crypto from "node:crypto";
+import fs from "node:fs";
+import os from "node:os";
+import path from "node:path";
+
+
+// Every question set request becomes a job with its own directory (`<root>/<id>/`, holding its
+// input.json and everything generated for it), so that requests running at the same time can't
+// overwrite each other's files. At most `workers` jobs run at once; the rest wait in order and
+// once `maxQueued` are waiting, new jobs are turned away until some of them are done.
+export class JobQueue {
+    constructor({
+        root,
+        run,
+        workers = os.availableParallelism?.() ?? os.cpus().length,
+        maxQueued = 8 * workers,
+        keepMs = 60 * 60 * 1000,
+    }) {
+        this.root = root;
+        // async (job) => result; generates the set described by `job.input` into `job.dir`
+        this.run = run;
+        this.workers = workers;
+        this.maxQueued = maxQueued;
+        // How long finished jobs (and their files) stay around to be downloaded
+        this.keepMs = keepMs;
+
+        this.jobs = new Map();
+        this.queued = [];
+        this.running = 0;
+
+        // Whatever is left over from a previous run can't be asked for anymore
+        fs.rmSync(root, { recursive: true, force: true });
+        fs.mkdirSync(root, { recursive: true });
+    }
+
+    get isFull() {
+        return this.queued.length >= this.maxQueued;
+    }
+
+    // The new job, or `undefined` if the queue is full. `run` replaces the queue's own for this job.
+    submit(input, run = this.run) {
+        if (this.isFull) {
+            return undefined;
+        }
+
+        const id = crypto.randomUUID();
+        const dir = path.join(this.root, id);
+        fs.mkdirSync(dir);
+
+        const job = {
+            id,
+            dir,
+            input,
+            run,
+            status: "queued",
+            error: undefined,
+            result: undefined,
+            createdAt: Date.now(),
+            startedAt: undefined,
+            finishedAt: undefined,
+        };
+        this.jobs.set(id, job);
+        this.queued.push(job);
+        this.next();
+
+        return job;
+    }
+
+    get(id) {
+        return this.jobs.get(id);
+    }
+
+    // Roughly how long until a worker frees up, for Retry-After
+    retryAfterSecs() {
+        const finished = [...this.jobs.values()].filter((job) => job.finishedAt !== undefined);
+        if (finished.length === 0) {
+            return 5;
+        }
+
+        const avgMs = finished.reduce((sum, job) => sum + job.finishedAt - job.startedAt, 0) / finished.length;
+        return Math.max(1, Math.ceil((avgMs * (this.queued.length + 1)) / this.workers / 1000));
+    }
+
+    describe(job) {
+        const desc = {
+            id: job.id,
+            status: job.status,
+            createdAt: new Date(job.createdAt).toISOString(),
+        };
+        if (job.status === "queued") {
+            desc.position = this.queued.indexOf(job) + 1;
+        }
+        if (job.startedAt !== undefined) {
+            desc.startedAt = new Date(job.startedAt).toISOString();
+        }
+        if (job.finishedAt !== undefined) {
+            desc.finishedAt = new Date(job.finishedAt).toISOString();
+        }
+        if (job.error !== undefined) {
+            desc.error = job.error;
+        }
+        if (job.result !== undefined) {
+            desc.result = job.result;
+        }
+
+        return desc;
+    }
+
+    next() {
+        while (this.running < this.workers && this.queued.length > 0) {
+            const job = this.queued.shift();
+            this.running += 1;
+            job.status = "running";
+            job.startedAt = Date.now();
+
+            job.run(job)
+                .then((result) => {
+                    job.status = "done";
+                    job.result = result;
+                })
+                .catch((error) => {
+                    console.error(`Job ${job.id} failed:`, error);
+                    job.status = "failed";
+                    job.error = error.message;
+                })
+                .finally(() => {
+                    job.finishedAt = Date.now();
+                    this.running -= 1;
+                    this.expire(job);
+                    this.next();
+                });
+        }
+    }
+
+    expire(job) {
+        setTimeout(() => {
+            this.jobs.delete(job.id);
+            fs.rmSync(job.dir, { recursive: true, force: true });
+        }, this.keepMs).unref();
+    }
+}
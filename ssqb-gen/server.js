@@ -1,32 +1,113 @@
 import cors from "cors";
 import express from "express";
 import fs from "node:fs";
-import { exec } from "node:child_process";
+import path from "node:path";
+import { exec, execFile } from "node:child_process";
+import { Readable } from "node:stream";
+import { pipeline } from "node:stream/promises";
+import { promisify } from "node:util";
+
+import { JobQueue } from "./jobs.js";
 
 
 const app = express();
 const port = 8080;
+// Address of `generate.py serve`; when it is not running, every request falls back to
+// starting `generate.py` for that request alone.
+const generatorUrl = process.env.GENERATOR_URL ?? "http://127.0.0.1:8081";
 
 // Allow cross-origin resource sharing (CORS)
 app.use(cors());
 app.use(express.json());
 
-let pdfOutputPath = "";
+// The generator runs from the repo root, so every path handed to it is relative to that
+const repoDir = "..";
+const jobs = new JobQueue({
+    root: path.join(repoDir, "jobs"),
+    run: runQsetJob,
+    ...(process.env.GENERATOR_WORKERS && { workers: Number(process.env.GENERATOR_WORKERS) }),
+    ...(process.env.GENERATOR_MAX_QUEUED && { maxQueued: Number(process.env.GENERATOR_MAX_QUEUED) }),
+});
 
-app.post("/filter-req", (req, res) => {
-    if (req.body === undefined) {
-        console.log("request body is undefined.");
-        res.status(400).send("Request body was undefined");
-        return;
+// NOTE: With the generator running, jobs are only worth running side by side up to the number of
+//       sets it can put together at once (`generate.py serve --jobs N`, one per cpu by default);
+//       without it every job is a process of its own, so the default of one per cpu stands.
+if (process.env.GENERATOR_WORKERS === undefined) {
+    callGenerator("GET", "/health")
+        .then((health) => {
+            if (health?.pdfJobs !== undefined) {
+                jobs.workers = health.pdfJobs;
+                console.log(`Running up to ${health.pdfJobs} job(s) at once (generator's pdf jobs)`);
+            }
+        })
+        .catch((error) => console.error("Error:", error));
+}
+
+// Resolves with the generator's json response, or with `undefined` if it isn't reachable
+async function callGenerator(method, route, body) {
+    let resp;
+    try {
+        resp = await fetch(`${generatorUrl}${route}`, {
+            method,
+            headers: { "Content-Type": "application/json" },
+            body: body === undefined ? undefined : JSON.stringify(body),
+        });
+    } catch {
+        return undefined;
+    }
+
+    const json = await resp.json();
+    if (!resp.ok) {
+        throw new Error(json.error ?? `generator responded with ${resp.status}`);
+    }
+    return json;
+}
+
+// Relays one of the generator's artifacts (id list, skill trees) including its ETag, so that a
+// client that already has it gets a 304. Resolves with `false` if the generator isn't reachable.
+async function relayArtifact(route, req, res) {
+    let resp;
+    try {
+        const headers = {};
+        if (req.headers["if-none-match"] !== undefined) {
+            headers["If-None-Match"] = req.headers["if-none-match"];
+        }
+        resp = await fetch(`${generatorUrl}${route}`, { headers });
+    } catch {
+        return false;
     }
 
-    const jsonStr = JSON.stringify(req.body, null, 4);
-    fs.writeFileSync("../input.json", jsonStr);
+    const etag = resp.headers.get("etag");
+    if (etag !== null) {
+        res.set("ETag", etag);
+        res.set("Cache-Control", "no-cache");
+    }
+    if (resp.status === 304) {
+        res.status(304).end();
+        return true;
+    }
 
-    pdfOutputPath = req.body["outputPath"];
+    res.status(resp.status).type("application/json").send(Buffer.from(await resp.arrayBuffer()));
+    return true;
+}
 
+// Without the generator, the artifacts are read straight from disk ('generate.py parse' writes
+// them); sendFile takes care of ETags and conditional requests by itself.
+function sendArtifact(name, res, onMissing) {
+    let index;
+    try {
+        index = JSON.parse(fs.readFileSync("../artifacts/all-q-parsed/index.json"));
+    } catch {
+        onMissing();
+        return;
+    }
+
+    res.sendFile(index.artifacts[name].file, { root: "../artifacts/all-q-parsed" });
+}
+
+function runGeneratorCmd(cmd, onDone) {
     exec(
-        "uv run generate.py qset input.json",
+        cmd,
         { cwd: "../" },
         (error, stdout, stderr) => {
             if (error) {
@@ -39,58 +120,212 @@ app.post("/filter-req", (req, res) => {
             }
             console.log("Stdout:", stdout);
             console.log("backend: Ran cmd")
-            res.status(200).send("Successful submitted JSON instructions");
+            onDone?.();
         }
     );
+}
+
+// The files a finished job can be downloaded as, by what generate.py names them
+const jobFiles = {
+    pdf: (name) => `${name}.pdf`,
+    key: (name) => `${name}-key.csv`,
+    template: (name) => `${name}-empty.csv`,
+};
+
+// NOTE: The frontend sends the whole 'outputPath' instead of cohort/folder/filename
+function jobFileName(input) {
+    return String(input.filename ?? path.basename(input.outputPath ?? "")).trim().replace(/\.pdf$/, "");
+}
+
+// NOTE: A job's set is written into its own directory instead of cohort/folder, which another
+//       request could be writing the same file names into at the same time
+function jobInput(job) {
+    return {
+        ...job.input,
+        cohort: path.relative(repoDir, job.dir),
+        folder: "",
+        filename: jobFileName(job.input),
+    };
+}
+
+function listJobFiles(job) {
+    const name = jobFileName(job.input);
+    return Object.keys(jobFiles).filter((kind) =>
+        fs.existsSync(path.join(job.dir, jobFiles[kind](name)))
+    );
+}
+
+async function runQsetJob(job) {
+    const input = jobInput(job);
+    const inputPath = path.join(input.cohort, "input.json");
+    fs.writeFileSync(path.join(repoDir, inputPath), JSON.stringify(input, null, 4));
+
+    const result = await callGenerator("POST", "/qset", input);
+    if (result === undefined) {
+        await promisify(execFile)("uv", ["run", "generate.py", "qset", inputPath], { cwd: repoDir });
+    }
+
+    const files = listJobFiles(job);
+    if (!files.includes("pdf")) {
+        throw new Error("No questions matched the filters");
+    }
+
+    return { count: result?.count, files };
+}
+
+// Pipes the pdf from the generator straight into `res`; nothing is written to disk unless
+// `persist`, in which case the files are also kept as the job's (see /jobs/<id>/download).
+async function streamQsetJob(job, persist, res) {
+    try {
+        let resp;
+        try {
+            resp = await fetch(`${generatorUrl}/qset/pdf${persist ? "?persist=1" : ""}`, {
+                method: "POST",
+                headers: { "Content-Type": "application/json" },
+                body: JSON.stringify(jobInput(job)),
+            });
+        } catch {
+            // Without the generator running there is nothing to stream from, so the set is made
+            // the usual way and sent from disk
+            const result = await runQsetJob(job);
+            const fileName = jobFiles.pdf(jobFileName(job.input));
+            res.download(path.join(job.dir, fileName), fileName);
+            return result;
+        }
+
+        if (!resp.ok) {
+            const { error } = await resp.json();
+            res.status(resp.status).send(error);
+            throw new Error(error);
+        }
+
+        res.status(200);
+        for (const name of ["Content-Type", "Content-Length", "Content-Disposition", "X-Question-Count"]) {
+            res.set(name, resp.headers.get(name));
+        }
+        await pipeline(Readable.fromWeb(resp.body), res);
+
+        return { count: Number(resp.headers.get("X-Question-Count")), files: listJobFiles(job) };
+    } catch (error) {
+        if (!res.headersSent) {
+            res.status(500).send(error.message);
+        }
+        throw error;
+    }
+}
+
+function checkQsetRequest(req, res) {
+    if (req.body === undefined) {
+        console.log("request body is undefined.");
+        res.status(400).send("Request body was undefined");
+        return false;
+    }
+    if (jobFileName(req.body) === "" || path.basename(jobFileName(req.body)) !== jobFileName(req.body)) {
+        res.status(400).send("Request body needs a plain 'filename' (or an 'outputPath')");
+        return false;
+    }
+
+    return true;
+}
+
+function queueFull(res) {
+    res.set("Retry-After", String(jobs.retryAfterSecs()));
+    res.status(503).send("Too many question sets are being generated right now, try again later");
+}
+
+app.post("/filter-req", (req, res) => {
+    if (!checkQsetRequest(req, res)) {
+        return;
+    }
+
+    // Sets are downloaded through /jobs/<id>/download, so they are saved small unless asked otherwise
+    const input = { saveProfile: "compact", ...req.body };
+
+    const job = jobs.submit(input);
+    if (job === undefined) {
+        queueFull(res);
+        return;
+    }
+
+    res.status(202).location(`/jobs/${job.id}`).json(jobs.describe(job));
 });
 
-app.get("/download", (req, res) => {
-    res.download(`../${pdfOutputPath}`);
-    res.status(200);
+// Same as /filter-req, but the response is the pdf itself (once the job gets its turn).
+// ?persist=1 also keeps the pdf and answer csvs, to be downloaded through /jobs/<id>/download.
+app.post("/filter-req/pdf", (req, res) => {
+    if (!checkQsetRequest(req, res)) {
+        return;
+    }
+
+    const input = { saveProfile: "compact", ...req.body };
+    const persist = ["1", "true"].includes(req.query.persist);
+
+    const job = jobs.submit(input, (job) => streamQsetJob(job, persist, res));
+    if (job === undefined) {
+        queueFull(res);
+        return;
+    }
+    res.set("X-Job-Id", job.id);
 });
 
-app.get("/all-ids", (req, res) => {
-    exec(
-        "uv run generate.py allids qids.json",
-        { cwd: "../" },
-        (error, stdout, stderr) => {
-            if (error) {
-                console.error("Error:", error);
-                return;
-            }
-            if (stderr) {
-                console.error("Stderr:", stderr);
-                return;
-            }
-            console.log("Stdout:", stdout);
-            console.log("backend: Ran cmd")
-        }
-    );
+app.get("/jobs/:id", (req, res) => {
+    const job = jobs.get(req.params.id);
+    if (job === undefined) {
+        res.status(404).send("Unknown (or expired) job");
+        return;
+    }
 
-    res.sendFile("qids.json", { root: ".." });
-    res.status(200);
+    res.status(200).json(jobs.describe(job));
+});
+
+// ?file=pdf (default), key or template
+app.get("/jobs/:id/download", (req, res) => {
+    const job = jobs.get(req.params.id);
+    if (job === undefined) {
+        res.status(404).send("Unknown (or expired) job");
+        return;
+    }
+    if (job.status !== "done") {
+        res.status(409).json(jobs.describe(job));
+        return;
+    }
+
+    const kind = req.query.file ?? "pdf";
+    if (!job.result.files.includes(kind)) {
+        res.status(404).send(`Job has no '${kind}' file`);
+        return;
+    }
+
+    const fileName = jobFiles[kind](jobFileName(job.input));
+    res.download(path.join(job.dir, fileName), fileName);
+});
+
+app.get("/all-ids", async (req, res) => {
+    if (await relayArtifact("/allids", req, res)) {
+        return;
+    }
+
+    sendArtifact("qids", res, () => {
+        runGeneratorCmd("uv run generate.py allids qids.json", () => {
+            res.sendFile("qids.json", { root: ".." });
+        });
+    });
 })
 
-app.get("/skill-tree", (req, res) => {
-    exec(
-        "uv run generate.py skilltree",
-        { cwd: "../" },
-        (error, stdout, stderr) => {
-            if (error) {
-                console.error("Error:", error);
-                return;
-            }
-            if (stderr) {
-                console.error("Stderr:", stderr);
-                return;
-            }
-            console.log("Stdout:", stdout);
-            console.log("backend: Ran cmd");
-        }
-    );
+app.get("/skill-tree", async (req, res) => {
+    const difficulty = ["1", "true"].includes(req.query.difficulty);
+    if (await relayArtifact(`/skilltree?difficulty=${difficulty ? 1 : 0}`, req, res)) {
+        return;
+    }
 
-    res.sendFile("skill-tree.json", { root: ".." });
-    res.status(200);
+    sendArtifact(difficulty ? "skill-tree-difficulty" : "skill-tree", res, () => {
+        // NOTE: The cli only writes the plain tree; the artifacts exist once it has run
+        runGeneratorCmd("uv run generate.py skilltree", () => {
+            sendArtifact(difficulty ? "skill-tree-difficulty" : "skill-tree", res, () => {
+                res.status(500).send("Could not build the skill tree");
+            });
+        });
+    });
 })
 
 app.listen(port, () => {
@@ -484,15 +484,26 @@ export default function App() {
         const jsonData = JSON.stringify(exportData, null, 4);
         setExportContent(jsonData);
 
-        fetch("http://localhost:8080/filter-req", {
+        // The response is the pdf itself; it never has to be saved to disk and read back first
+        fetch("http://localhost:8080/filter-req/pdf", {
             method: "POST",
             headers: {
                 "Content-Type": "application/json",
             },
             body: jsonData,
-        }).then(() => {
-            // console.log(`http://localhost:8080/download`);
-            window.open("http://localhost:8080/download");
+        }).then(async (response) => {
+            if (!response.ok) {
+                console.error(await response.text());
+                return;
+            }
+
+            const url = URL.createObjectURL(await response.blob());
+            const link = document.createElement("a");
+            link.href = url;
+            link.download = path.split("/").pop() ?? path;
+            link.click();
+            // Revoking right away can cancel the download before it starts (Firefox, Safari)
+            setTimeout(() => URL.revokeObjectURL(url), 60_000);
         });
     };
 